@@ -0,0 +1,133 @@
+"""Regression checks of the plugin code, run headless like the benchmarks
+
+    python bench/checks.py
+
+Every function named check_* is run, a failing one raises.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import traceback
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCH_DIR, 'stubs'), os.path.dirname(BENCH_DIR)]
+
+import sublime
+
+from fake_server import FakeIdeServer
+from ide import command, utility
+from ide.auto_complete import CompletionEventListener
+from ide.index import IntervalIndex, ModuleIndex
+from ide.text_command import ReplaceRegionCommand
+
+
+def imported(module_info):
+    return None if module_info is None else [i['module'] for i in module_info['imports']]
+
+
+def check_header_typed_into_empty_buffer():
+    view = sublime.View('')
+    assert utility.view_module_header(view) is None
+    view.insert('module Foo where\nimport Prelude\n', 0)
+    module_info = utility.view_module_header(view)
+    assert module_info is not None and module_info['moduleName'] == 'Foo', module_info
+
+
+def check_import_appended_at_end_of_header():
+    view = sublime.View('module Bar where\nimport Prelude\n')
+    assert imported(utility.view_module_header(view)) == ['Prelude']
+    view.insert('import Data.Maybe\n', view.size())
+    assert imported(utility.view_module_header(view)) == ['Prelude', 'Data.Maybe']
+    # Code below the imports closes the header, edits after it keep the cache
+    view.insert('\nmain = pure unit\n', view.size())
+    assert imported(utility.view_module_header(view)) == ['Prelude', 'Data.Maybe']
+    view.insert('x = 1\n', view.size())
+    assert imported(utility.view_module_header(view)) == ['Prelude', 'Data.Maybe']
+
+
+def check_import_completed_on_last_line():
+    view = sublime.View('module Bar where\nimport Prelude\nimp')
+    assert imported(utility.view_module_header(view)) == ['Prelude']
+    view.insert('ort Data.Array', view.size())
+    assert imported(utility.view_module_header(view)) == ['Prelude', 'Data.Array']
+
+
+def check_import_only_inserts_its_line():
+    sublime.text_commands['replace_region'] = ReplaceRegionCommand
+    file_text = 'module Bar where\nimport Prelude\n\nmain = pure unit\n'
+    view = sublime.View(file_text)
+    # purs answers with the lines of the file, without the final newline
+    result = file_text.splitlines()
+    result.insert(2, 'import Data.Maybe (Maybe)')
+    assert utility.minimal_edit(file_text, '\n'.join(result) + '\n') == (32, 32, 'import Data.Maybe (Maybe)\n')
+    CompletionEventListener(view).apply_import(view, file_text, result)
+    assert view.text == 'module Bar where\nimport Prelude\nimport Data.Maybe (Maybe)\n\nmain = pure unit\n', view.text
+
+
+def check_interval_index_finds_innermost():
+    index = IntervalIndex([(0, 100, 'outer'), (10, 50, 'middle'), (20, 30, 'inner'), (40, 60, 'crossing')])
+    assert [index.at(p) for p in [0, 10, 20, 30, 31, 40, 50, 51, 60, 61]] == \
+        ['outer', 'middle', 'inner', 'inner', 'middle', 'crossing', 'crossing', 'crossing', 'crossing', 'outer']
+    assert index.at(-1) is None and index.at(101) is None
+
+    rng = random.Random(0)
+    for _ in range(200):
+        intervals = []
+        for i in range(rng.randint(0, 12)):
+            begin = rng.randint(0, 40)
+            intervals.append((begin, begin + rng.randint(0, 20), i))
+        index = IntervalIndex(intervals)
+        for point in range(-1, 62):
+            containing = [x for x in intervals if x[0] <= point <= x[1]]
+            expected = [x[2] for x in containing if (x[0], -x[1]) == max([(y[0], -y[1]) for y in containing])]
+            found = index.at(point)
+            assert found in expected if len(expected) > 0 else found is None, (intervals, point, found)
+
+
+def check_rebuild_after_module_rename():
+    directory = tempfile.mkdtemp(prefix='purescript-ide-check-')
+    fake = FakeIdeServer(payload_size=0).start()
+    try:
+        file_name = os.path.join(directory, 'Old.purs')
+        with open(file_name, 'w') as f:
+            f.write('module Old where\n')
+        server = command.Server(directory)
+        server.client = command.IdeClient(fake.port)
+        command.servers[directory] = server
+        command.projects_modules[directory] = ModuleIndex(['Old', 'Other'])
+        type_cache = command.project_cache(command.type_caches, directory)
+        type_cache.set(('Old', 'x', ()), [])
+        command.remember_module_name(directory, file_name, 'Old')
+
+        with open(file_name, 'w') as f:
+            f.write('module New where\n')
+        success, _ = command.rebuild_with_status(directory, file_name)
+        assert success
+        names = command.projects_modules[directory].starting_with('')
+        assert names == ['New', 'Other'], names
+        assert ('Old', 'x', ()) not in type_cache
+    finally:
+        fake.stop()
+        command.servers.pop(directory, None)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    failed = 0
+    for name, check in sorted(globals().items()):
+        if not name.startswith('check_'):
+            continue
+        try:
+            check()
+            print('ok     ' + name)
+        except Exception:
+            failed += 1
+            print('FAILED ' + name)
+            traceback.print_exc()
+    sys.exit(1 if failed > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
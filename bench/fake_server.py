@@ -0,0 +1,113 @@
+"""A stand-in for `purs ide server` answering with canned responses
+
+Every response waits `delay` seconds first, like a server that is busy
+typechecking. `payload_size` is the number of results of a complete
+command and of errors of a rebuild, which decides how much JSON goes over
+the socket and has to be decoded.
+"""
+import json
+import socketserver
+import threading
+import time
+
+
+def declaration(i):
+    return { 'module': 'Bench.Module%d' % (i % 50)
+           , 'identifier': 'identifier%d' % i
+           , 'type': 'forall a. Array a -> Maybe (Tuple Int a)'
+           , 'expandedType': 'forall a. Array a -> Maybe (Tuple Int a)'
+           , 'exportedFrom': ['Bench.Module%d' % (i % 50)]
+           , 'definedAt': { 'name': 'src/Bench/Module%d.purs' % (i % 50)
+                          , 'start': [i + 1, 1]
+                          , 'end': [i + 1, 20]
+                          }
+           , 'documentation': None
+           , 'declarationType': 'value'
+           }
+
+
+def rebuild_error(i):
+    return { 'errorCode': 'UnknownName'
+           , 'moduleName': 'Main'
+           , 'filename': 'src/Main.purs'
+           , 'message': '  Unknown value identifier%d\n' % i
+           , 'errorLink': 'https://github.com/purescript/documentation/blob/master/errors/UnknownName.md'
+           , 'suggestion': None
+           , 'position': { 'startLine': i + 1, 'startColumn': 1
+                         , 'endLine': i + 1, 'endColumn': 10
+                         }
+           }
+
+
+class FakeIdeServer(object):
+    def __init__(self, delay=0.0, payload_size=100):
+        self.delay = delay
+        self.payload_size = payload_size
+        self.requests = 0
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                request = json.loads(self.rfile.readline().decode('utf-8'))
+                fake.requests += 1
+                if fake.delay > 0:
+                    time.sleep(fake.delay)
+                result_type, result = fake.respond(request)
+                response = json.dumps({'resultType': result_type, 'result': result})
+                self.wfile.write((response + '\n').encode('utf-8'))
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+            # Parallel benchmarks connect at once, a short backlog
+            # drops connections that are then retried a second later
+            request_queue_size = 128
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+
+    def respond(self, request):
+        command = request['command']
+        params = request.get('params', {})
+        if command == 'cwd':
+            return ('success', '/')
+        if command == 'load':
+            return ('success', 'Loaded modules')
+        if command == 'complete':
+            count = self.payload_size
+            if 'options' in params:
+                count = min(count, params['options'].get('maxResults', count))
+            return ('success', [declaration(i) for i in range(count)])
+        if command == 'type':
+            return ('success', [declaration(0)])
+        if command == 'list' and params['type'] == 'import':
+            with open(params['file'], encoding='utf-8') as f:
+                text = f.read()
+            return ('success', { 'moduleName': 'Main'
+                               , 'imports': [ {'module': 'Prelude', 'importType': 'implicit'}
+                                            , {'module': 'Data.Maybe', 'importType': 'implicit'}
+                                            ] if 'import' in text else []
+                               })
+        if command == 'list':
+            return ('success', ['Bench.Module%d' % i for i in range(50)])
+        if command == 'import':
+            with open(params['file'], encoding='utf-8') as f:
+                # Like purs, which answers with T.lines: no trailing empty line
+                lines = f.read().splitlines()
+            module = params['filters'][0]['params']['modules'][0]
+            lines.insert(1, 'import %s (%s)' % (module, params['importCommand'].get('identifier', '')))
+            return ('success', lines)
+        if command == 'rebuild':
+            errors = [rebuild_error(i) for i in range(self.payload_size)]
+            return ('error' if len(errors) > 0 else 'success', errors)
+        return ('error', 'Unknown command ' + command)
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,359 @@
+"""Benchmarks of the plugin against a fake purs ide server
+
+Runs the real ide/ code with a stub of the Sublime Text API and a local
+stand-in for `purs ide server`, then writes a JSON report named after
+the current commit, so runs on different commits can be compared:
+
+    python bench/run.py
+    python bench/run.py --delay 0.01 --payload 500 --iterations 50
+    python bench/run.py --compare bench/reports/<older commit>.json
+
+Times are in milliseconds. The fake server runs in the same process, so
+absolute numbers only mean something next to a report from the same
+machine and options.
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [os.path.join(BENCH_DIR, 'stubs'), ROOT_DIR]
+
+import sublime
+
+from fake_server import FakeIdeServer
+from ide import command, settings, utility
+from ide.stats import request_stats
+from ide.auto_complete import CompletionEventListener
+from ide.index import ProjectRootIndex
+from ide.rebuild import show_errors
+from ide.text_command import ReplaceRegionCommand
+from ide.type_hints import TypeHintEventListener
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(times, operations=1):
+    times = sorted(times)
+    total = sum(times)
+    return { 'count': len(times)
+           , 'mean': 1000 * total / len(times)
+           , 'p50': 1000 * percentile(times, 0.5)
+           , 'p95': 1000 * percentile(times, 0.95)
+           , 'max': 1000 * times[-1]
+           , 'per_second': operations * len(times) / total if total > 0 else None
+           }
+
+
+def measure(iterations, run, setup=lambda: None, operations=1):
+    run()  # warm up
+    times = []
+    for _ in range(iterations):
+        setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return summarize(times, operations)
+
+
+def module_text(import_count, body_lines):
+    lines = ['module Bench.Main where', '']
+    lines += ['import Bench.Module%d as M%d' % (i, i) for i in range(import_count)]
+    lines += ['']
+    lines += ['value%d = M%d.identifier%d 1' % (i, i % import_count, i) for i in range(body_lines)]
+    return '\n'.join(lines) + '\n'
+
+
+class Fixture(object):
+    """A project on disk, a window showing one of its files and a server"""
+    def __init__(self, options):
+        super().__init__()
+        self.directory = tempfile.mkdtemp(prefix='purescript-ide-bench-')
+        sublime.cache_directory = os.path.join(self.directory, 'cache')
+        self.project_path = os.path.join(self.directory, 'app')
+        # Deep enough that finding the project root walks a few directories
+        source_dir = os.path.join(self.project_path, 'src', 'Bench', 'Deep', 'Er', 'Still')
+        os.makedirs(source_dir)
+        with open(os.path.join(self.project_path, 'spago.dhall'), 'w') as f:
+            f.write('{}\n')
+        for i in range(50):
+            output_dir = os.path.join(self.project_path, 'output', 'Bench.Module%d' % i)
+            os.makedirs(output_dir)
+            open(os.path.join(output_dir, 'externs.cbor'), 'w').close()
+
+        self.file_name = os.path.join(source_dir, 'Main.purs')
+        self.text = module_text(options.imports, options.lines)
+        with open(self.file_name, 'w', encoding='utf-8') as f:
+            f.write(self.text)
+
+        self.window = sublime.Window([self.directory])
+        sublime.open_windows[:] = [self.window]
+        self.view = sublime.View(self.text, self.file_name, self.window)
+
+        self.fake = FakeIdeServer(options.delay, options.payload).start()
+        server = command.Server(self.project_path)
+        server.port = self.fake.port
+        server.client = command.IdeClient(self.fake.port)
+        server.ready.set()
+        server.loaded.set()
+        command.servers[self.project_path] = server
+
+    def reset_view(self):
+        self.view.replace(None, sublime.Region(0, self.view.size()), self.text)
+
+    def close(self):
+        self.fake.stop()
+        command.servers.pop(self.project_path, None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def hover_point(fixture):
+    return fixture.text.index('identifier0') + 2
+
+
+def bench_completion(fixture, iterations):
+    p = fixture.project_path
+    engine = command.completion_engine(p)
+    results = {}
+    results['completion_server'] = measure(
+        iterations,
+        lambda: command.get_code_complete(p, 'iden'),
+        setup=engine.invalidate)
+
+    def refine_setup():
+        engine.invalidate()
+        command.get_code_complete(p, 'i')
+    results['completion_refine_local'] = measure(
+        iterations,
+        lambda: command.get_local_code_complete(p, 'ide'),
+        setup=refine_setup)
+
+    results['completion_module_names'] = measure(
+        iterations,
+        lambda: command.get_module_complete(p, 'Bench.Mod'))
+    return results
+
+
+def bench_hover(fixture, iterations):
+    p = fixture.project_path
+    view = fixture.view
+    listener = TypeHintEventListener(view)
+    point = hover_point(fixture)
+    results = {}
+
+    # Where the imports of the hovered file come from
+    results['hover_header_local'] = measure(
+        iterations,
+        lambda: utility.view_module_header(view),
+        setup=utility.header_cache.clear)
+    results['hover_header_server'] = measure(
+        iterations,
+        lambda: command.send_project_command(
+            p, {'command': 'list', 'params': {'file': fixture.file_name, 'type': 'import'}}))
+
+    def hover():
+        type_info = listener.lookup_type_hint(view, point)
+        listener.show_type_hint(view, point, type_info)
+
+    def cold_setup():
+        utility.header_cache.clear()
+        command.project_cache(command.type_caches, p).clear()
+    results['hover_cold'] = measure(iterations, hover, setup=cold_setup)
+    results['hover_cached'] = measure(iterations, hover)
+
+    # Several views asking at once, through one server
+    def parallel_lookups():
+        command.project_cache(command.type_caches, p).clear()
+        threads = [ threading.Thread(target=lambda i=i: command.get_type(p, 'Bench.Main', 'identifier%d' % i))
+                    for i in range(8) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    results['hover_parallel_8'] = measure(max(1, iterations // 8), parallel_lookups, operations=8)
+    return results
+
+
+def bench_auto_import(fixture, iterations):
+    view = fixture.view
+    listener = CompletionEventListener(view)
+    completion = { 'identifier': 'identifier1'
+                 , 'module': 'Bench.Extra'
+                 , 'type': 'Int'
+                 , 'module_alias': None
+                 }
+    key = 'identifier1\tBench.Extra\tInt'
+
+    def setup():
+        fixture.reset_view()
+        listener.last_completion_results = {key: completion}
+        view.last_command = ('insert_completion', {'completion': key}, 1)
+
+    def run():
+        change_count = view.change_count()
+        listener.on_modified_async()
+        if not view.wait_for_change(change_count, 10):
+            raise RuntimeError('the import was not applied')
+
+    setup()
+    result = measure(iterations, run, setup=setup)
+    fixture.reset_view()
+    return {'auto_import': result}
+
+
+def bench_rebuild(fixture, iterations):
+    p = fixture.project_path
+    view = fixture.view
+
+    def rebuild_and_render():
+        _, errors = command.rebuild_with_status(p, fixture.file_name)
+        show_errors(view, fixture.file_name, errors)
+    return {'rebuild_and_render': measure(iterations, rebuild_and_render)}
+
+
+def bench_project_root(fixture, iterations):
+    view = fixture.view
+
+    def cold_setup():
+        utility.project_root_index = ProjectRootIndex()
+    results = {}
+    results['project_root_cold'] = measure(
+        iterations, lambda: utility.find_project_dir(view), setup=cold_setup)
+    results['project_root_cached'] = measure(
+        iterations, lambda: utility.find_project_dir(view))
+    return results
+
+
+def bench_spawn(fixture, iterations):
+    env_path = os.environ['PATH']
+
+    def spawn():
+        # path given, so the login shell is not asked for PATH
+        proc = command.spawn_command([shutil.which('true') or sys.executable, '-c', ''], path=env_path)
+        proc.stdout.read()
+        proc.wait()
+
+    def cold_setup():
+        command.child_environment_cache = None
+    results = {}
+    results['spawn_environment_cold'] = measure(
+        iterations, lambda: command.child_environment(env_path), setup=cold_setup)
+    results['spawn_environment_cached'] = measure(
+        iterations, lambda: command.child_environment(env_path))
+    results['spawn_process'] = measure(iterations, spawn)
+    results['cmd_escape_argument'] = measure(
+        iterations, lambda: command.cmd_escape_argument('C:\\Program Files\\purs (x86)\\purs.cmd "%PATH%" a&b|c'))
+    return results
+
+
+BENCHMARKS = [ ('completion', bench_completion)
+             , ('hover', bench_hover)
+             , ('auto_import', bench_auto_import)
+             , ('rebuild', bench_rebuild)
+             , ('project_root', bench_project_root)
+             , ('spawn', bench_spawn)
+             ]
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR).decode().strip()
+        dirty = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT_DIR).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ('unknown', False)
+    return (commit, len(dirty) > 0)
+
+
+def print_results(results):
+    print('%-28s %10s %10s %10s %12s' % ('benchmark', 'p50 ms', 'p95 ms', 'max ms', 'ops/s'))
+    for name in sorted(results.keys()):
+        r = results[name]
+        print('%-28s %10.3f %10.3f %10.3f %12.1f' % (
+            name, r['p50'], r['p95'], r['max'], r['per_second'] or 0))
+
+
+def print_comparison(old_report, results):
+    print('\ncompared with %s (p50 ms)' % old_report['commit'])
+    old_results = old_report['results']
+    for name in sorted(set(results.keys()) | set(old_results.keys())):
+        if name not in old_results or name not in results:
+            print('%-28s %s' % (name, 'only in ' + ('this run' if name in results else 'the old report')))
+            continue
+        old, new = old_results[name]['p50'], results[name]['p50']
+        change = (new - old) / old * 100 if old > 0 else 0
+        print('%-28s %10.3f -> %10.3f  %+7.1f%%' % (name, old, new, change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='seconds the fake server waits before every response')
+    parser.add_argument('--payload', type=int, default=100,
+                        help='results of a complete command and errors of a rebuild')
+    parser.add_argument('--imports', type=int, default=30,
+                        help='imports of the benchmarked module')
+    parser.add_argument('--lines', type=int, default=2000,
+                        help='lines of code after the imports of the benchmarked module')
+    parser.add_argument('--only', action='append',
+                        help='run only this group, may be repeated: ' +
+                             ', '.join([name for name, _ in BENCHMARKS]))
+    parser.add_argument('--stats', action='store_true',
+                        help='record and print the request statistics of the plugin')
+    parser.add_argument('--output', help='report path, bench/reports/<commit>.json by default')
+    parser.add_argument('--compare', help='an earlier report to compare with')
+    options = parser.parse_args()
+
+    settings.update_settings()
+    sublime.text_commands['replace_region'] = ReplaceRegionCommand
+    settings.settings['enable_stats'] = options.stats
+    fixture = Fixture(options)
+    results = {}
+    try:
+        for name, benchmark in BENCHMARKS:
+            if options.only and name not in options.only:
+                continue
+            results.update(benchmark(fixture, options.iterations))
+    finally:
+        fixture.close()
+
+    commit, dirty = git_commit()
+    report = { 'commit': commit
+             , 'dirty': dirty
+             , 'date': datetime.datetime.now().isoformat()
+             , 'python': sys.version.split()[0]
+             , 'platform': sys.platform
+             , 'options': vars(options)
+             , 'results': results
+             }
+    output = options.output or os.path.join(
+        BENCH_DIR, 'reports', commit + ('-dirty' if dirty else '') + '.json')
+    if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+        os.makedirs(os.path.dirname(os.path.abspath(output)))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    print_results(results)
+    if options.stats:
+        print('\n'.join(request_stats.report()))
+    if options.compare:
+        with open(options.compare) as f:
+            print_comparison(json.load(f), results)
+    print('\nreport written to ' + output)
+
+
+if __name__ == '__main__':
+    main()
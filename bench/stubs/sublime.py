@@ -0,0 +1,260 @@
+# Just enough of the Sublime Text API for the ide/ modules to run headless
+
+import re
+import threading
+
+DRAW_NO_FILL = 32
+DRAW_NO_OUTLINE = 256
+DRAW_SQUIGGLY_UNDERLINE = 2048
+LAYOUT_BLOCK = 2
+HIDE_ON_MOUSE_MOVE_AWAY = 2
+ENCODED_POSITION = 1
+
+cache_directory = None
+open_windows = []
+# command name -> TextCommand subclass, run by View.run_command
+text_commands = {}
+
+
+class Settings(dict):
+    def get(self, key, default=None):
+        return dict.get(self, key, default)
+
+    def set(self, key, value):
+        self[key] = value
+
+    def add_on_change(self, key, callback):
+        pass
+
+
+loaded_settings = {}
+
+def load_settings(name):
+    return loaded_settings.setdefault(name, Settings())
+
+
+def set_timeout(callback, delay=0):
+    # Run right away when there is no delay, so that a measurement
+    # includes the work the plugin hands to the UI thread
+    if delay == 0:
+        callback()
+        return
+    timer = threading.Timer(delay / 1000.0, callback)
+    timer.daemon = True
+    timer.start()
+
+set_timeout_async = set_timeout
+
+
+def windows():
+    return open_windows
+
+
+def cache_path():
+    return cache_directory
+
+
+def status_message(message):
+    pass
+
+
+class Region(object):
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return self.end() - self.begin()
+
+    def contains(self, point):
+        return self.begin() <= point <= self.end()
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and (self.a, self.b) == (other.a, other.b)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Region(%d, %d)' % (self.a, self.b)
+
+
+class Selection(list):
+    def add(self, region):
+        self.append(region)
+
+
+class Phantom(object):
+    def __init__(self, region, content, layout):
+        self.region = region
+        self.content = content
+        self.layout = layout
+
+
+class PhantomSet(object):
+    def __init__(self, view, key=''):
+        self.view = view
+        self.phantoms = []
+
+    def update(self, phantoms):
+        self.phantoms = phantoms
+
+
+class Window(object):
+    def __init__(self, folders):
+        self.folder_list = folders
+        self.view_list = []
+        self.panels = {}
+
+    def folders(self):
+        return self.folder_list
+
+    def views(self):
+        return self.view_list
+
+    def active_view(self):
+        return self.view_list[0] if len(self.view_list) > 0 else None
+
+    def find_open_file(self, file_name):
+        for view in self.view_list:
+            if view.file_name() == file_name:
+                return view
+        return None
+
+    def create_output_panel(self, name):
+        panel = View('')
+        self.panels[name] = panel
+        return panel
+
+    def status_message(self, message):
+        pass
+
+    def run_command(self, command, args=None):
+        pass
+
+    def open_file(self, file_name, flags=0):
+        pass
+
+
+WORD_RE = re.compile(r"[\w']+")
+
+class View(object):
+    next_id = 1
+
+    def __init__(self, text, file_name=None, window=None):
+        self.view_id = View.next_id
+        View.next_id += 1
+        self.text = text
+        self.file = file_name
+        self.parent = window
+        self.changes = 0
+        self.view_settings = Settings(
+            syntax='Packages/purescript/purescript.sublime-syntax',
+            auto_complete_triggers=[])
+        self.selection = Selection([Region(0)])
+        self.regions = {}
+        self.popups = []
+        self.last_command = ('', None, 0)
+        self.lock = threading.Lock()
+        self.modified = threading.Condition(self.lock)
+        if window is not None:
+            window.view_list.append(self)
+
+    def id(self):
+        return self.view_id
+
+    def file_name(self):
+        return self.file
+
+    def window(self):
+        return self.parent
+
+    def settings(self):
+        return self.view_settings
+
+    def is_valid(self):
+        return True
+
+    def is_dirty(self):
+        return False
+
+    def size(self):
+        return len(self.text)
+
+    def change_count(self):
+        return self.changes
+
+    def substr(self, region):
+        if isinstance(region, int):
+            return self.text[region:region+1]
+        return self.text[region.begin():region.end()]
+
+    def sel(self):
+        return self.selection
+
+    def text_point(self, row, col):
+        offset = 0
+        for _ in range(row):
+            newline = self.text.find('\n', offset)
+            if newline == -1:
+                return len(self.text)
+            offset = newline + 1
+        return offset + col
+
+    def word(self, point):
+        if isinstance(point, Region):
+            point = point.begin()
+        begin = end = point
+        while begin > 0 and WORD_RE.match(self.text[begin-1]):
+            begin -= 1
+        while end < len(self.text) and WORD_RE.match(self.text[end]):
+            end += 1
+        return Region(begin, end)
+
+    def line(self, point):
+        if isinstance(point, Region):
+            point = point.begin()
+        begin = self.text.rfind('\n', 0, point) + 1
+        end = self.text.find('\n', point)
+        return Region(begin, len(self.text) if end == -1 else end)
+
+    def visible_region(self):
+        return Region(0, len(self.text))
+
+    def add_regions(self, key, regions, scope='', icon='', flags=0):
+        self.regions[key] = regions
+
+    def show_popup(self, content, flags=0, location=-1, max_width=320, max_height=240, on_navigate=None):
+        self.popups.append(content)
+
+    def show_at_center(self, region):
+        pass
+
+    def command_history(self, index, modifying_only=False):
+        return self.last_command
+
+    def replace(self, edit, region, text):
+        with self.lock:
+            self.text = self.text[:region.begin()] + text + self.text[region.end():]
+            self.changes += 1
+            self.modified.notify_all()
+
+    def insert(self, text, point):
+        self.replace(None, Region(point), text)
+
+    def run_command(self, name, args=None):
+        command = text_commands.get(name, None)
+        if command is not None:
+            command(self).run(None, **(args or {}))
+
+    def wait_for_change(self, change_count, timeout):
+        with self.lock:
+            if self.changes == change_count:
+                self.modified.wait(timeout)
+            return self.changes != change_count
@@ -1,20 +1,24 @@
 import sublime
 import sublime_plugin
+import threading
 import time
-import tempfile
-import os
 import webbrowser
 from functools import wraps
 
 from .command import ( CodeCompleteThread
                      , ModuleCompleteThread
+                     , get_local_code_complete
                      , add_import
                      , log
-                     , get_module_imports)
+                     )
 from .utility import ( find_project_dir
                      , PurescriptViewEventListener
                      , module_word
+                     , minimal_edit
+                     , write_scratch_file
+                     , view_module_header
                      )
+from .profiling import profiled
 from .settings import get_settings
 
 
@@ -31,6 +35,7 @@ class CompletionEventListener(PurescriptViewEventListener):
         self.view.settings().set('auto_complete_triggers', auto)
 
 
+    @profiled
     def on_query_completions(self, prefix, locations):
         view = self.view
         if view.file_name() is None:
@@ -82,24 +87,20 @@ class CompletionEventListener(PurescriptViewEventListener):
             self.current_completion_prefix = prefix
             self.last_completion_results = {}
             self.last_completions = []
+
+            # Refining the previous prefix can be answered without the server
+            result = get_local_code_complete(project_path, prefix)
+            if result is not None:
+                self.set_completion_results(result, module_alias)
+                return self.last_completions
+
             def callback(_prefix, result):
                 if _prefix != self.current_completion_prefix:
                     # We have new input so this result is discarded
                     return
-                for r in result:
-                    str_to_display = r['identifier']+'\t'+r['module']+'\t'+r['type']
-
-                    # Remove completely duplicated entry
-                    if str_to_display in self.last_completion_results:
-                        continue
-
-                    # module alias for qualified import
-                    r['module_alias'] = module_alias
-                    # In order to know which completion the user selected
-                    # we have to save all completions, and catch the completion
-                    # event in on_modified_async
-                    self.last_completion_results[str_to_display] = r
-                    self.last_completions.append([str_to_display, r['identifier']])
+                if result is None:
+                    return
+                self.set_completion_results(result, module_alias)
 
             this_thread = CodeCompleteThread(project_path, prefix, callback)
             this_thread.start()
@@ -109,6 +110,23 @@ class CompletionEventListener(PurescriptViewEventListener):
         else:
             return self.last_completions
 
+    def set_completion_results(self, result, module_alias):
+        for r in result:
+            str_to_display = r['identifier']+'\t'+r['module']+'\t'+r['type']
+
+            # Remove completely duplicated entry
+            if str_to_display in self.last_completion_results:
+                continue
+
+            # module alias for qualified import
+            r = dict(r, module_alias=module_alias)
+            # In order to know which completion the user selected
+            # we have to save all completions, and catch the completion
+            # event in on_modified_async
+            self.last_completion_results[str_to_display] = r
+            self.last_completions.append([str_to_display, r['identifier']])
+
+    @profiled
     def on_modified_async(self):
         # Import the module after the user selected the auto complete
         view = self.view
@@ -121,38 +139,57 @@ class CompletionEventListener(PurescriptViewEventListener):
         if completion is None:
             return
 
+        # Prevent importing again when pressed undo
+        self.last_completion_results = None
+
         project_path = find_project_dir(view)
+        file_text = view.substr(sublime.Region(0, view.size()))
 
         if completion.get('module_alias') is not None:
-            file_imports = get_module_imports(project_path, view.file_name())['imports']
+            # The buffer itself tells whether the alias is imported already,
+            # no need to ask the server about the possibly stale file on disk
+            module_info = view_module_header(view)
+            file_imports = [] if module_info is None else module_info['imports']
             is_alias_exist = any([a.get('qualifier') == completion['module_alias'] for a in file_imports])
             if is_alias_exist:
                 return
 
-        file_text = view.substr(sublime.Region(0, view.size()))
-
         # TODO, also import the types
 
-        # 1. Save the content of file to somewhere else
-        # 2. Use psc-ide to get the new content after auto import
-        # 3. Replace the file with the new content
-        # 4. Delete temp file
-        temp_file = tempfile.NamedTemporaryFile(delete=False)
-        temp_file.write(file_text.encode('utf-8'))
-        temp_file.close()
-        result = add_import(
-            project_path,
-            temp_file.name,
-            completion['module'],
-            completion['identifier'],
-            qualifier=completion['module_alias'])
-        os.unlink(temp_file.name)
-
-        view.run_command('replace', {'text': '\n'.join(result)})
-
-        pos = view.word(view.sel()[0]).end()
-        view.sel().clear()
-        view.sel().add(sublime.Region(pos))
-
-        # Prevent replace again when pressed undo
-        self.last_completion_results = None
+        def perform():
+            # purs ide reads the content from a file, reuse the scratch
+            # file of this view, kept in memory where possible
+            scratch_file = write_scratch_file(view, file_text, purpose='import')
+            result = add_import(
+                project_path,
+                scratch_file,
+                completion['module'],
+                completion['identifier'],
+                qualifier=completion['module_alias'])
+            if result is None:
+                return
+            sublime.set_timeout(lambda: self.apply_import(view, file_text, result), 0)
+
+        threading.Thread(target=perform).start()
+
+    def apply_import(self, view, file_text, result):
+        # Only touch the lines that changed, usually a few in the import
+        # section, instead of replacing the whole buffer. purs answers with
+        # the lines of the file, the final newline is gone from them
+        new_text = '\n'.join(result)
+        if file_text.endswith('\n') and not new_text.endswith('\n'):
+            new_text += '\n'
+        edit = minimal_edit(file_text, new_text)
+        if edit is None:
+            return
+        begin, end, replacement = edit
+        # The user may have kept typing, which is fine as long
+        # as nothing up to the end of the edit has changed
+        if view.substr(sublime.Region(0, end)) != file_text[:end]:
+            message = 'Import not added, the imports changed meanwhile: ' + replacement.strip()
+            log(message)
+            sublime.status_message(message)
+            return
+        view.run_command(
+            'replace_region',
+            {'text': replacement, 'start': begin, 'end': end})
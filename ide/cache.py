@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """A size bounded mapping that evicts the least recently used entry
+
+    Lookups through `get` are counted in `hits` and `misses`, `peek` reads
+    an entry without counting or refreshing it.
+    """
+    def __init__(self, maxsize=1000):
+        super().__init__()
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def peek(self, key, default=None):
+        with self.lock:
+            return self.entries.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.entries.pop(key, default)
+
+    def remove_if(self, predicate):
+        # predicate :: key -> value -> Bool
+        with self.lock:
+            keys = [k for k, v in self.entries.items() if predicate(k, v)]
+            for k in keys:
+                del self.entries[k]
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            return { 'size': len(self.entries)
+                   , 'maxsize': self.maxsize
+                   , 'hits': self.hits
+                   , 'misses': self.misses
+                   }
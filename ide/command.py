@@ -1,11 +1,26 @@
 import os
 import subprocess
 import threading
-import json
 import time
 import sys
 import re
-from .settings import get_settings
+from collections import deque
+from .cache import LRUCache
+from .client import IdeClient, IdeClientError
+from .completion import CompletionEngine
+from .imports import MODULE_RE
+from .index import ModuleIndex
+from .environment import ( environment_cache
+                         , file_mtime
+                         , parse_version
+                         , shell_key
+                         , PROTOCOL_FEATURES
+                         )
+from . import settings
+from .settings import get_settings, plugin_loaded as load_settings
+from .stats import request_stats, stats_enabled
+from .utility import remove_scratch_dir
+from .warm_cache import WarmCache, output_module_mtimes
 
 
 def log(*args):
@@ -13,6 +28,10 @@ def log(*args):
         print(*args)
 
 
+# Finding the environment runs a shell and purs, which
+# is done by one thread at a time and only once
+environment_lock = threading.RLock()
+
 path_cache = None
 def guess_path():
     global path_cache
@@ -21,37 +40,54 @@ def guess_path():
     if sys.platform == "win32":
         return os.environ['PATH']
 
-    if path_cache is None:
-        try:
-            shell = os.environ['SHELL']
-            if shell.endswith('zsh'):
-                path_cache = run_command([
-                    os.environ['SHELL'],
-                    '--login',
-                    '--interactive',
-                    '-c',
-                    'echo " __SUBLIME_PURESCRIPT__$PATH __SUBLIME_PURESCRIPT__"'
-                    ],
-                    path=os.environ['PATH'])[1].split(' __SUBLIME_PURESCRIPT__')[1]
-            else:
-                # normal bash
-                path_cache = run_command([
-                    os.environ['SHELL'],
-                    '--login',
-                    '-c',
-                    'echo " __SUBLIME_PURESCRIPT__$PATH __SUBLIME_PURESCRIPT__"'
-                    ],
-                    path=os.environ['PATH'])[1].split(' __SUBLIME_PURESCRIPT__')[1]
-        except Exception as e:
-            path_cache = os.environ['PATH']+':/usr/local/bin'
+    with environment_lock:
+        if path_cache is None:
+            key = shell_key()
+            path_cache = environment_cache.get('path', key)
+            if path_cache is None:
+                path_cache = login_shell_path()
+                if path_cache is None:
+                    path_cache = os.environ['PATH']+':/usr/local/bin'
+                else:
+                    environment_cache.set('path', key, path_cache)
     return path_cache
 
 
-def run_command(commands, stdin_text=None, path=None):
-    if path is None:
-        env_path = guess_path()
-    else:
-        env_path = os.environ['PATH']
+def login_shell_path():
+    try:
+        shell = os.environ['SHELL']
+        if shell.endswith('zsh'):
+            return run_command([
+                os.environ['SHELL'],
+                '--login',
+                '--interactive',
+                '-c',
+                'echo " __SUBLIME_PURESCRIPT__$PATH __SUBLIME_PURESCRIPT__"'
+                ],
+                path=os.environ['PATH'])[1].split(' __SUBLIME_PURESCRIPT__')[1]
+        else:
+            # normal bash
+            return run_command([
+                os.environ['SHELL'],
+                '--login',
+                '-c',
+                'echo " __SUBLIME_PURESCRIPT__$PATH __SUBLIME_PURESCRIPT__"'
+                ],
+                path=os.environ['PATH'])[1].split(' __SUBLIME_PURESCRIPT__')[1]
+    except Exception as e:
+        return None
+
+
+# (PATH, inherited PATH, settings generation, environment)
+child_environment_cache = None
+def child_environment(env_path):
+    # The environment of subprocesses, built again only when
+    # the PATH they get, our own PATH or the settings change
+    global child_environment_cache
+    key = (env_path, os.environ.get('PATH', None), settings.settings_generation)
+    cached = child_environment_cache
+    if cached is not None and cached[:3] == key:
+        return cached[3]
     new_env = dict(
         os.environ,
         TERM='ansi',
@@ -59,6 +95,16 @@ def run_command(commands, stdin_text=None, path=None):
         PATH=env_path)
     for k, v in new_env.items():
         new_env[k] = os.path.expandvars(v)
+    child_environment_cache = key + (new_env,)
+    return new_env
+
+
+def spawn_command(commands, stdin_text=None, path=None, cwd=None):
+    if path is None:
+        env_path = guess_path()
+    else:
+        env_path = os.environ['PATH']
+    new_env = child_environment(env_path)
     log('running: ', commands)
 
     # Hide the console window on Windows
@@ -73,6 +119,7 @@ def run_command(commands, stdin_text=None, path=None):
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             startupinfo=startupinfo,
+            cwd=cwd,
             # TBH I dont know why windows need shell to work
             shell=True,
         )
@@ -84,11 +131,17 @@ def run_command(commands, stdin_text=None, path=None):
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             startupinfo=startupinfo,
+            cwd=cwd,
         )
     if stdin_text is not None:
         proc.stdin.write(stdin_text.encode('utf-8'))
         proc.stdin.close()
-    result = b''
+    return proc
+
+
+def run_command(commands, stdin_text=None, path=None):
+    proc = spawn_command(commands, stdin_text=stdin_text, path=path)
+    chunks = []
     exit_int = None
     while True:
         exit_int = proc.poll()
@@ -96,10 +149,11 @@ def run_command(commands, stdin_text=None, path=None):
             break
         line = proc.stdout.readline() # This blocks until it receives a newline.
         log(line)
-        result += line
+        chunks.append(line)
     # When the subprocess terminates there might be unconsumed output
     # that still needs to be processed.
-    result += proc.stdout.read()
+    chunks.append(proc.stdout.read())
+    result = b''.join(chunks)
     if exit_int != 0:
         log('purescript-ide-sublime error', exit_int, result)
         pass
@@ -114,24 +168,124 @@ def get_purs_path():
     if custom_path is not None:
         return custom_path
 
-    if not purs_path_cache:
-        try:
-            if sys.platform == "win32":
-                num, result = run_command(['where', 'purs.cmd'])
-            else:
-                num, result = run_command(['which', 'purs'])
-            if num != 0:
-                raise Exception()
-            purs_path_cache = result.replace('\n', '')
-        except Exception:
-            return None
+    with environment_lock:
+        if not purs_path_cache:
+            env_path = guess_path()
+            cached_path = environment_cache.get('purs_path', env_path)
+            if cached_path is not None and os.path.isfile(cached_path):
+                purs_path_cache = cached_path
+                return purs_path_cache
+            try:
+                if sys.platform == "win32":
+                    num, result = run_command(['where', 'purs.cmd'])
+                else:
+                    num, result = run_command(['which', 'purs'])
+                if num != 0:
+                    raise Exception()
+                purs_path_cache = result.replace('\n', '')
+                environment_cache.set('purs_path', env_path, purs_path_cache)
+            except Exception:
+                return None
     return purs_path_cache
 
 
+# (purs path, version tuple or None)
+purs_version_cache = None
+def get_purs_version():
+    # (major, minor, patch) of purs, None if unknown
+    global purs_version_cache
+
+    purs_path = get_purs_path()
+    if purs_path is None:
+        return None
+
+    with environment_lock:
+        if purs_version_cache is None or purs_version_cache[0] != purs_path:
+            key = [purs_path, file_mtime(purs_path)]
+            version = environment_cache.get('purs_version', key)
+            if version is None:
+                try:
+                    num, result = run_command([purs_path, '--version'])
+                    version = parse_version(result) if num == 0 else None
+                except Exception:
+                    version = None
+                if version is not None:
+                    environment_cache.set('purs_version', key, list(version))
+            purs_version_cache = (purs_path, None if version is None else tuple(version))
+    return purs_version_cache[1]
+
+
+def purs_supports(feature):
+    # Never runs purs, the version is found before a server starts.
+    # Versions that are not known are taken to be recent
+    version = None if purs_version_cache is None else purs_version_cache[1]
+    return version is None or version >= PROTOCOL_FEATURES[feature]
+
+
+def resolve_environment():
+    purs_path = get_purs_path()
+    log('PATH:', guess_path(), 'purs:', purs_path, 'version:', get_purs_version())
+
+
 # Path: Thread
 servers = {}
-# Path: [String] (module name)
+# Path: ModuleIndex
 projects_modules = {}
+# Path: LRUCache of (module name, identifier, (imported module)) -> type info
+type_caches = {}
+# Path: {file path: module name}, as of the last successful
+# rebuild of the file, or as it was opened before that
+file_modules = {}
+# Path: CompletionEngine
+completion_engines = {}
+# Path: WarmCache, only kept while the server is loading
+warm_caches = {}
+
+
+def project_cache(caches, project_path):
+    cache = caches.get(project_path, None)
+    if cache is None:
+        cache = LRUCache(get_settings('type_cache_size', 2000))
+        caches[project_path] = cache
+    return cache
+
+
+def invalidate_module(project_path, module_name):
+    # Forget the type info that may have changed after module_name is rebuilt,
+    # when the module name is unknown everything of the project is dropped
+    type_cache = type_caches.get(project_path, None)
+    if type_cache is None:
+        return
+    if module_name is None:
+        type_cache.clear()
+        return
+
+    def is_affected(key, type_info):
+        current_module, _, imported_modules = key
+        if current_module == module_name or module_name in imported_modules:
+            return True
+        return any([ t['module'] == module_name or module_name in t.get('exportedFrom', [])
+                     for t in type_info ])
+    type_cache.remove_if(is_affected)
+
+
+def invalidate_project(project_path):
+    type_cache = type_caches.get(project_path, None)
+    if type_cache is not None:
+        type_cache.clear()
+    completion_engine(project_path).invalidate()
+    # Modules may have been removed, fetch the list again when needed
+    projects_modules.pop(project_path, None)
+
+
+def read_module_name(file_path):
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            match = MODULE_RE.search(f.read())
+    except (IOError, OSError, UnicodeDecodeError):
+        return None
+    return None if match is None else match.group(1)
+
 
 class Server(threading.Thread):
     def __init__(self, project_path):
@@ -139,49 +293,205 @@ class Server(threading.Thread):
         self.project_path = project_path
         default_port = get_settings('port_starts_from', 4242)
         self.port = max([s.port for s in servers.values()] + [default_port-1]) + 1
+        self.client = IdeClient(self.port)
+        self.process = None
+        # Only the tail of the server output is kept, a long session
+        # would otherwise hold the whole transcript in memory
+        self.output = deque(maxlen=get_settings('server_log_lines', 1000))
+        self.output_lock = threading.Lock()
+        # Set once the server is accepting commands and modules are loaded
+        self.ready = threading.Event()
+        # Set once every module is loaded
+        self.loaded = threading.Event()
 
     def run(self):
-        servers[self.project_path] = self
         purs_path = get_purs_path()
         if not purs_path:
+            servers.pop(self.project_path, None)
             return
-        exit_int, stdout = run_command([
+        log('purs version', get_purs_version())
+        self.process = spawn_command([
             purs_path, 'ide', 'server',
             '--directory', self.project_path,
             './**/*.purs',
-            '--log-level', 'all',
+            '--log-level', get_settings('server_log_level', 'none'),
             '--port', str(self.port)])
+        for line in iter(self.process.stdout.readline, b''):
+            with self.output_lock:
+                self.output.append(line.decode('utf-8', 'replace').rstrip('\r\n'))
+        exit_int = self.process.wait()
+        log('purs ide server for', self.project_path, 'exited with', exit_int)
         servers.pop(self.project_path, None)
 
+    def wait_until_listening(self, timeout):
+        # Probe with the cheap `cwd` command until the server answers,
+        # backing off exponentially. Gives up early if the server exited.
+        deadline = time.monotonic() + timeout
+        delay = 0.02
+        while True:
+            try:
+                self.client.send({"command": "cwd"}, timeout=1)
+                return True
+            except IdeClientError:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.is_alive():
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
+
+    def output_tail(self, count=None):
+        with self.output_lock:
+            lines = list(self.output)
+        if count is not None:
+            lines = lines[-count:]
+        return lines
+
+
+def load_modules(server, modules=None):
+    params = {} if modules is None else {"modules": modules}
+    return_val = send_client_command(
+        server.port,
+        {"command": "load", "params": params},
+        server.project_path)
+    log(return_val)
+    if return_val is None or return_val['resultType'] != 'success':
+        return None
+    invalidate_project(server.project_path)
+    return return_val['result']
+
 
-def start_server(project_path, on_message=lambda x:x):
+def start_server(project_path, on_message=lambda x:x, priority_modules=lambda: []):
     if project_path in servers:
         log('purs ide server for', project_path, 'is alrady started')
         return
 
-    if get_purs_path() is None:
-        on_message('Cannot find purs. See logs.')
-        print('Cannot find purs in PATH: '+guess_path())
-        print('Please set custom path in purescript-ide.sublime-settings with the key "purs_path"')
-        return
-
     server = Server(project_path)
-    server.start()
+    # Registered right away, so that activating another view of
+    # the project meanwhile does not start a second server
+    servers[project_path] = server
 
     def load_all_files():
-        retry = 0
-        while True:
-            time.sleep(0.5)
-            return_val = send_client_command(server.port, {"command": "load", "params": {}})
-            log(return_val)
-            if return_val is not None and return_val[0] == 0:
-                on_message(json.loads(return_val[1])['result'])
-                break
-            retry += 1
-            if retry >= 10:
-                break
+        # Finding purs may wait for the login shell, which is why
+        # this is not done on the thread calling start_server
+        if get_purs_path() is None:
+            servers.pop(project_path, None)
+            on_message('Cannot find purs. See logs.')
+            print('Cannot find purs in PATH: '+guess_path())
+            print('Please set custom path in purescript-ide.sublime-settings with the key "purs_path"')
+            return
+        server.start()
+        on_message('Starting purs ide server at path: ' + project_path)
+
+        if get_settings('enable_warm_cache', True):
+            load_warm_cache(project_path)
+        try:
+            module_mtimes = load_project()
+        finally:
+            # Loaded or failed, the warm cache is of no more use either way
+            warm_caches.pop(project_path, None)
+        if module_mtimes is not None and get_settings('enable_warm_cache', True):
+            save_warm_cache(project_path, module_mtimes)
+
+    def load_project():
+        # The mtimes of the modules loaded, None if loading failed
+        # or the server found the modules itself
+        if not server.wait_until_listening(get_settings('server_start_timeout', 30)):
+            if server.is_alive():
+                on_message('purs ide server did not start in time at path: ' + project_path)
+            else:
+                on_message('purs ide server exited at path: ' + project_path + '. See logs.')
+            print('purs ide server for', project_path, 'failed to start, last output:')
+            print('\n'.join(server.output_tail(20)))
+            return
+
+        module_mtimes = output_module_mtimes(project_path)
+        if module_mtimes is None:
+            # Nothing to prioritise, let the server find everything
+            result = load_modules(server)
+            if result is None:
+                on_message('purs ide server failed to load modules. See logs.')
+                return
+            server.ready.set()
+            server.loaded.set()
+            on_message(result)
+            return
+        all_modules = list(module_mtimes.keys())
+
+        # Modules of the open files go first so that hover and completion
+        # work early, the rest is loaded in batches afterwards
+        available = set(all_modules)
+        first = [m for m in unique(priority_modules()) if m in available]
+        loaded = set(first)
+        rest = [m for m in all_modules if m not in loaded]
+        batch_size = max(1, get_settings('load_batch_size', 200))
+        batches = [first] + [rest[i:i+batch_size] for i in range(0, len(rest), batch_size)]
+
+        count = 0
+        for batch in batches:
+            if len(batch) == 0:
+                continue
+            if project_path not in servers:
+                return
+            if load_modules(server, batch) is None:
+                on_message('purs ide server failed to load modules. See logs.')
+                return
+            server.ready.set()
+            count += len(batch)
+            on_message('Loaded %d/%d modules at path: %s' % (count, len(all_modules), project_path))
+        server.loaded.set()
+        return module_mtimes
     threading.Thread(target=load_all_files).start()
-    on_message('Starting purs ide server at path: ' + project_path)
+
+
+def load_warm_cache(project_path):
+    try:
+        warm = WarmCache.load(project_path)
+    except Exception as e:
+        log('failed to read the warm cache of', project_path, e)
+        return
+    if warm is not None:
+        log('warm cache of', project_path, 'has', len(warm.declarations), 'declarations')
+        warm_caches[project_path] = warm
+
+
+def save_warm_cache(project_path, module_mtimes):
+    # Everything the server knows, for the next start of the editor
+    result = send_project_command(
+        project_path,
+        {
+            "command": "complete",
+            "params": {"filters": []}
+        })
+    if result is None or result['resultType'] != 'success':
+        return
+    try:
+        WarmCache.from_declarations(module_mtimes, result['result']).save(project_path)
+    except (IOError, OSError) as e:
+        log('failed to write the warm cache of', project_path, e)
+
+
+def warm_cache(project_path):
+    # The warm cache of a project whose server is still loading modules
+    server = servers.get(project_path, None)
+    if server is not None and server.loaded.is_set():
+        return None
+    return warm_caches.get(project_path, None)
+
+
+def server_ready(project_path):
+    server = servers.get(project_path, None)
+    return server is not None and server.ready.is_set()
+
+
+def unique(items):
+    seen = set()
+    result = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            result.append(item)
+    return result
 
 def stop_server(project_path):
     if project_path not in servers:
@@ -194,24 +504,56 @@ def stop_all_servers():
     for project_path in list(servers.keys()):
         stop_server(project_path)
 
-def send_client_command(port, json_obj):
-    purs_path = get_purs_path()
-    if not purs_path:
+def send_request(client, project_path, json_obj):
+    # Every request to purs ide goes through here, returns None on failure
+    timings = {} if stats_enabled() else None
+    try:
+        result = client.send(json_obj, timings=timings)
+    except IdeClientError as e:
+        log('purs ide request failed:', e)
+        result = None
+    if timings is not None:
+        request_stats.record(project_path, json_obj['command'], timings, result)
+    return result
+
+def send_client_command(port, json_obj, project_path=None):
+    return send_request(IdeClient(port), project_path, json_obj)
+
+def send_project_command(project_path, json_obj):
+    server = servers.get(project_path, None)
+    if server is None:
+        log('Server for path ', project_path, ' is not running')
         return None
-    return run_command([
-        purs_path, 'ide', 'client',
-        '--port', str(port)],
-        stdin_text=json.dumps(json_obj))
+    return send_request(server.client, project_path, json_obj)
 
 def send_quit_command(port):
     return send_client_command(port, {"command":"quit"})
 
+def completion_engine(project_path):
+    engine = completion_engines.get(project_path, None)
+    if engine is None:
+        engine = CompletionEngine(
+            lambda prefix, max_results: fetch_code_complete(project_path, prefix, max_results),
+            get_settings('auto_complete_fetch_size', 200))
+        completion_engines[project_path] = engine
+    return engine
+
+
 def get_code_complete(project_path, prefix):
-    if project_path not in servers:
-        log('Server for path ', project_path, ' is not running')
-        return
-    num, result = send_client_command(
-        servers[project_path].port,
+    return completion_engine(project_path).complete(prefix)
+
+
+def get_local_code_complete(project_path, prefix):
+    # Returns None when the server has to be asked
+    return completion_engine(project_path).complete_locally(prefix)
+
+
+def fetch_code_complete(project_path, prefix, max_results):
+    warm = warm_cache(project_path)
+    if warm is not None and not server_ready(project_path):
+        return warm.completions(prefix, max_results)
+    result = send_project_command(
+        project_path,
         {
             "command":"complete",
             "params":{
@@ -220,13 +562,15 @@ def get_code_complete(project_path, prefix):
                     "params":{"search":prefix}
                 },
                 "options": {
-                    "maxResults": 10
+                    "maxResults": max_results
                 }
             }
         })
-    result = json.loads(result)
-    if result['resultType'] != 'success':
+    if result is None or result['resultType'] != 'success':
         return None
+    if len(result['result']) == 0 and warm is not None:
+        # The module may not be loaded yet
+        return warm.completions(prefix, max_results)
     return result['result']
 
 
@@ -250,24 +594,27 @@ def get_module_complete(project_path, prefix):
         log('Server for path ', project_path, ' is not running')
         return
 
+    warm = warm_cache(project_path)
+    if warm is not None and not server_ready(project_path):
+        return warm.module_index.starting_with(prefix)
+
     modules = projects_modules.get(project_path, None)
 
     if modules is None:
-        num, result = send_client_command(
-        servers[project_path].port,
+        result = send_project_command(
+        project_path,
         {
             "command": "list",
             "params": {
                 "type": "availableModules"
             }
         })
-        result = json.loads(result)
-        if result['resultType'] != 'success':
+        if result is None or result['resultType'] != 'success':
             return None
-        modules = result['result']
+        modules = ModuleIndex(result['result'])
         projects_modules[project_path] = modules
 
-    return [m for m in modules if m.lower().startswith(prefix.lower())]
+    return modules.starting_with(prefix)
 
 
 class ModuleCompleteThread(threading.Thread):
@@ -284,8 +631,8 @@ class ModuleCompleteThread(threading.Thread):
 
 
 def add_import(project_path, file_path, module, identifier, qualifier=None):
-    num, result = send_client_command(
-        servers[project_path].port,
+    result = send_project_command(
+        project_path,
         {
             "command": "import",
             "params": {
@@ -308,30 +655,41 @@ def add_import(project_path, file_path, module, identifier, qualifier=None):
             }
         }
     )
-    result = json.loads(result)
-    if result['resultType'] != 'success':
+    if result is None or result['resultType'] != 'success':
         return None
     return result['result']
 
 
-def get_module_imports(project_path, file_path):
-    num, result = send_client_command(
-        servers[project_path].port,
-        {
-            "command": "list",
-            "params": {
-                "file": file_path,
-                "type": "import"
-            }
-        }
-    )
-    result = json.loads(result)
-    if result['resultType'] != 'success':
-        return None
-    return result['result']
+def remember_module_name(project_path, file_path, module_name):
+    # The module a file held when it was opened, which tells
+    # the first rebuild after a rename what the old name was
+    if project_path is None or module_name is None:
+        return
+    file_modules.setdefault(project_path, {}).setdefault(file_path, module_name)
+
+
+def type_cache_key(module_name, identifier, imported_modules):
+    return (module_name, identifier, tuple(sorted(imported_modules)))
+
+
+def is_type_cached(project_path, module_name, identifier, imported_modules=[]):
+    cache = project_cache(type_caches, project_path)
+    return type_cache_key(module_name, identifier, imported_modules) in cache
 
 
 def get_type(project_path, module_name, identifier, imported_modules=[]):
+    cache = project_cache(type_caches, project_path)
+    cache_key = type_cache_key(module_name, identifier, imported_modules)
+    type_info = cache.get(cache_key)
+    if type_info is not None:
+        return type_info
+
+    # Answers of the warm cache are not cached, they are replaced
+    # by the server ones once the modules are loaded
+    warm = warm_cache(project_path)
+    if warm is not None and not server_ready(project_path):
+        return warm.type_info(identifier, imported_modules)
+
     filters = []
     if len(imported_modules) > 0:
         filters.append({
@@ -341,8 +699,8 @@ def get_type(project_path, module_name, identifier, imported_modules=[]):
            }
         })
 
-    num, result = send_client_command(
-        servers[project_path].port,
+    result = send_project_command(
+        project_path,
         {
             "command": "type",
             "params": {
@@ -352,36 +710,84 @@ def get_type(project_path, module_name, identifier, imported_modules=[]):
             }
         }
     )
-    result = json.loads(result)
-    if result['resultType'] != 'success':
+    if result is None or result['resultType'] != 'success':
         return None
+    if len(result['result']) == 0 and warm is not None:
+        return warm.type_info(identifier, imported_modules)
+    cache.set(cache_key, result['result'])
     return result['result']
 
 
-def rebuild(project_path, file_path):
-    num, result = send_client_command(
-        servers[project_path].port,
+def rebuild_with_status(project_path, file_path, codegen=None, actual_file=None):
+    # Returns (whether the module compiled, errors and warnings)
+    #
+    # codegen is the list of codegen targets, like ["js"],
+    # an empty list only typechecks, None uses the server default.
+    # actual_file is the real path of a module read from a scratch file_path
+    params = {"file": file_path}
+    if codegen is not None and purs_supports('rebuild_codegen'):
+        params["codegen"] = codegen
+    if actual_file is not None:
+        if not purs_supports('rebuild_actual_file'):
+            # The server would take the scratch file for the module source
+            return (False, None)
+        params["actualFile"] = actual_file
+    result = send_project_command(
+        project_path,
         {
           "command": "rebuild",
-          "params": {
-            "file": file_path
-          }
+          "params": params
         }
     )
-    result = json.loads(result)
-    # Clean modules cache for auto complete
-    projects_modules.pop(project_path, None)
-    return result['result']
+    if result is None or not isinstance(result['result'], list):
+        return (False, None)
+    completion_engine(project_path).invalidate()
+    # The imports and the types exported by this module may have changed
+    success = result['resultType'] == 'success'
+    source_file = file_path if actual_file is None else actual_file
+    modules_of_files = file_modules.setdefault(project_path, {})
+    old_module_name = modules_of_files.get(source_file, None)
+    module_name = read_module_name(file_path)
+    if success and module_name is not None:
+        modules_of_files[source_file] = module_name
+    invalidate_module(project_path, module_name)
+    if old_module_name is not None and old_module_name != module_name:
+        invalidate_module(project_path, old_module_name)
+    # Update the module list for auto complete in place,
+    # the module may be a new one or may have been renamed
+    modules = projects_modules.get(project_path, None)
+    if modules is not None and success:
+        if old_module_name is not None and old_module_name != module_name:
+            modules.remove(old_module_name)
+        if module_name is not None:
+            modules.add(module_name)
+    return (success, result['result'])
+
+
+def rebuild(project_path, file_path, codegen=None, actual_file=None):
+    return rebuild_with_status(project_path, file_path, codegen, actual_file)[1]
+
+
+def plugin_loaded():
+    load_settings()
+    # Run the login shell and purs now, in the background, rather
+    # than in the first event handler that needs them
+    threading.Thread(target=resolve_environment).start()
 
 
 def plugin_unloaded():
     stop_all_servers()
+    remove_scratch_dir()
 
 
 
 # The follow codes are copied from
 # https://stackoverflow.com/a/29215357/
 
+CMD_QUOTE_RE = re.compile(r'["\s]')
+# Every cmd.exe meta character gets escaped with ^
+CMD_META_ESCAPES = str.maketrans(dict([(c, '^' + c) for c in '()%!^"<>&|']))
+
 def cmd_escape_argument(arg):
     # Escape the argument for the cmd.exe shell.
     # See http://blogs.msdn.com/b/twistylittlepassagesallalike/archive/2011/04/23/everyone-quotes-arguments-the-wrong-way.aspx
@@ -389,7 +795,7 @@ def cmd_escape_argument(arg):
     # First we escape the quote chars to produce a argument suitable for
     # CommandLineToArgvW. We don't need to do this for simple arguments.
 
-    if not arg or re.search(r'(["\s])', arg):
+    if not arg or CMD_QUOTE_RE.search(arg):
         arg = '"' + arg.replace('"', r'\"') + '"'
 
     return escape_for_cmd_exe(arg)
@@ -410,12 +816,4 @@ def escape_for_cmd_exe(arg):
     # @return [String] an escaped string suitable to be passed as a program
     #   argument to cmd.exe
 
-    meta_chars = '()%!^"<>&|'
-    meta_re = re.compile('(' + '|'.join(re.escape(char) for char in list(meta_chars)) + ')')
-    meta_map = { char: "^%s" % char for char in meta_chars }
-
-    def escape_meta_chars(m):
-        char = m.group(1)
-        return meta_map[char]
-
-    return meta_re.sub(escape_meta_chars, arg)
+    return arg.translate(CMD_META_ESCAPES)
@@ -0,0 +1,77 @@
+import re
+import threading
+
+
+def flex_score(pattern, identifier):
+    # Mirrors the "flex" matcher of purs ide: the characters of the pattern
+    # have to appear in order, matches that start early and are compact
+    # score higher. Returns None when the identifier does not match.
+    if pattern == '':
+        return None
+    match = re.search('.*?'.join([re.escape(c) for c in pattern]), identifier)
+    if match is None:
+        return None
+    start, end = match.span()
+    return 100.0 / ((1 + start) * (end - start + 1))
+
+
+class CompletionEngine(object):
+    """Answer completion requests of a project, locally when possible
+
+    A larger candidate set than what is shown is fetched from the server.
+    While the user keeps typing, the new prefix refines the previous one
+    and every flex match of the new prefix is also a match of the old one,
+    so the cached set can be filtered and re-ranked without asking again.
+    This only holds if the server did not truncate the set, a truncated
+    set only answers the exact prefix it was fetched for.
+    """
+    def __init__(self, fetch, fetch_size=200):
+        super().__init__()
+        # fetch :: prefix -> max_results -> Maybe [Completion]
+        self.fetch = fetch
+        self.fetch_size = fetch_size
+        self.prefix = None
+        self.candidates = None
+        self.truncated = True
+        self.lock = threading.Lock()
+
+    def complete_locally(self, prefix):
+        with self.lock:
+            cached_prefix = self.prefix
+            candidates = self.candidates
+            truncated = self.truncated
+
+        if cached_prefix is None or candidates is None:
+            return None
+        if prefix == cached_prefix:
+            return candidates
+        if cached_prefix == '' or truncated or not prefix.startswith(cached_prefix):
+            return None
+
+        scored = []
+        for index, c in enumerate(candidates):
+            score = flex_score(prefix, c['identifier'])
+            if score is not None:
+                scored.append((-score, index, c))
+        scored.sort(key=lambda x: (x[0], x[1]))
+        return [c for _, _, c in scored]
+
+    def complete(self, prefix):
+        result = self.complete_locally(prefix)
+        if result is not None:
+            return result
+
+        result = self.fetch(prefix, self.fetch_size)
+        if result is None:
+            return None
+        with self.lock:
+            self.prefix = prefix
+            self.candidates = result
+            self.truncated = len(result) >= self.fetch_size
+        return result
+
+    def invalidate(self):
+        with self.lock:
+            self.prefix = None
+            self.candidates = None
+            self.truncated = True
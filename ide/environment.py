@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import threading
+
+import sublime
+
+
+# Files a login shell reads, a change to any of them may change PATH
+SHELL_RC_FILES = [ '/etc/profile'
+                 , '/etc/zprofile'
+                 , '/etc/zshrc'
+                 , '~/.profile'
+                 , '~/.bash_profile'
+                 , '~/.bash_login'
+                 , '~/.bashrc'
+                 , '~/.zshenv'
+                 , '~/.zprofile'
+                 , '~/.zshrc'
+                 , '~/.zlogin'
+                 ]
+
+VERSION_RE = re.compile(r'(\d+)\.(\d+)\.(\d+)')
+
+# Oldest purs version supporting a protocol feature
+PROTOCOL_FEATURES = { 'rebuild_codegen': (0, 12, 0)
+                    , 'rebuild_actual_file': (0, 12, 0)
+                    }
+
+
+def parse_version(text):
+    # `purs --version` prints like "0.15.4" or "0.15.4 [development build]"
+    match = VERSION_RE.search(text)
+    if match is None:
+        return None
+    return tuple([int(x) for x in match.groups()])
+
+
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def shell_key():
+    # What the PATH of a login shell depends on
+    return { 'shell': os.environ.get('SHELL', None)
+           , 'path': os.environ.get('PATH', None)
+           , 'rc_files': dict([ (f, file_mtime(os.path.expanduser(f)))
+                                for f in SHELL_RC_FILES ])
+           }
+
+
+class EnvironmentCache(object):
+    """The login shell PATH, purs path and purs version, kept on disk
+
+    Finding them runs a login shell and purs, which can take seconds with
+    heavy rc files. Entries are stored with what they depend on and only
+    returned while that is unchanged: the shell and the mtimes of its rc
+    files for PATH, PATH for the purs path, and the mtime of the purs
+    binary for its version.
+    """
+    def __init__(self):
+        super().__init__()
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def file_path(self):
+        return os.path.join(sublime.cache_path(), 'purescript-ide', 'environment.json')
+
+    def load(self):
+        if self.entries is not None:
+            return
+        try:
+            with open(self.file_path(), encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.entries = {}
+        if not isinstance(self.entries, dict):
+            self.entries = {}
+
+    def get(self, name, key):
+        with self.lock:
+            self.load()
+            entry = self.entries.get(name, None)
+        if entry is None or entry.get('key') != key:
+            return None
+        return entry.get('value', None)
+
+    def set(self, name, key, value):
+        with self.lock:
+            self.load()
+            self.entries[name] = {'key': key, 'value': value}
+            path = self.file_path()
+            try:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                temp_path = '%s.%d.tmp' % (path, os.getpid())
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f)
+                os.replace(temp_path, path)
+            except (IOError, OSError):
+                pass
+
+
+environment_cache = EnvironmentCache()
@@ -1,22 +1,65 @@
+import os
+
+from .index import IntervalIndex
+
+
 class ErrorManager(object):
     """Manage all detect errors"""
     def __init__(self,):
         super().__init__()
 
         # errors is a map like this
-        # {'file_name.purs': [(region1, error1), (region2, error2), ...]}
+        # {'file_name.purs': IntervalIndex of (begin, end, (region, error))}
         self.errors = {}
 
+        # Errors reported for files that are not open, they only get
+        # regions once a view shows the file
+        # {'file_name.purs': [error]}
+        self.unrendered_errors = {}
+
     # regions_and_errors :: Array (Tuple Region Error)
     # I want type :(
     def set_errors(self, file_name, regions_and_errors):
-        self.errors[file_name] = regions_and_errors
+        self.errors[file_name] = IntervalIndex([
+            (region.begin(), region.end(), (region, error))
+            for region, error in regions_and_errors])
+
+    def set_unrendered_errors(self, file_name, errors):
+        self.unrendered_errors[file_name] = errors
+
+    def clear_unrendered_errors(self, directory):
+        # Forget the ones of files under directory, before a new build
+        prefix = os.path.join(directory, '')
+        for file_name in list(self.unrendered_errors.keys()):
+            if file_name.startswith(prefix):
+                del self.unrendered_errors[file_name]
+
+    def take_unrendered_errors(self, file_name):
+        return self.unrendered_errors.pop(file_name, None)
 
     def get_error_at_point(self, file_name, point):
-        things = self.errors.get(file_name, [])
-        for region, error in things:
-            if region.contains(point):
-                return error
-        return None
+        index = self.errors.get(file_name, None)
+        if index is None:
+            return None
+        found = index.at(point)
+        if found is None:
+            return None
+        return found[1]
+
+    # Returns (region, error) of the next error after point,
+    # wrapping around to the first one
+    def next_error(self, file_name, point):
+        index = self.errors.get(file_name, None)
+        if index is None:
+            return None
+        found = index.next_after(point) or index.first()
+        return None if found is None else found[2]
+
+    def previous_error(self, file_name, point):
+        index = self.errors.get(file_name, None)
+        if index is None:
+            return None
+        found = index.previous_before(point) or index.last()
+        return None if found is None else found[2]
 
 error_manager = ErrorManager()
@@ -0,0 +1,133 @@
+import re
+
+
+MODULE_RE = re.compile(r'^module\s+([\w.]+)', re.MULTILINE)
+NAME_RE = re.compile(r"[A-Za-z_][\w']*(?:\.[A-Za-z_][\w']*)*")
+SYMBOL_CHARS = set(':!#$%&*+./<=>?@\\^|-~')
+
+
+class HeaderScanner(object):
+    """Walks the module header, skipping whitespace and comments"""
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+        self.pos = 0
+
+    def skip_trivia(self):
+        text = self.text
+        while self.pos < len(text):
+            c = text[self.pos]
+            if c.isspace():
+                self.pos += 1
+            elif text.startswith('--', self.pos) and self.is_line_comment():
+                end = text.find('\n', self.pos)
+                self.pos = len(text) if end == -1 else end
+            elif text.startswith('{-', self.pos):
+                self.skip_block_comment()
+            else:
+                break
+
+    def is_line_comment(self):
+        # `--` starts a comment unless it is part of an operator like `-->`
+        end = self.pos
+        while end < len(self.text) and self.text[end] == '-':
+            end += 1
+        return end >= len(self.text) or self.text[end] not in SYMBOL_CHARS
+
+    def skip_block_comment(self):
+        # Block comments nest
+        depth = 0
+        text = self.text
+        while self.pos < len(text):
+            if text.startswith('{-', self.pos):
+                depth += 1
+                self.pos += 2
+            elif text.startswith('-}', self.pos):
+                depth -= 1
+                self.pos += 2
+                if depth == 0:
+                    return
+            else:
+                self.pos += 1
+
+    def peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else None
+
+    def read_name(self):
+        self.skip_trivia()
+        match = NAME_RE.match(self.text, self.pos)
+        if match is None:
+            return None
+        self.pos = match.end()
+        return match.group(0)
+
+    def accept_word(self, word):
+        self.skip_trivia()
+        match = NAME_RE.match(self.text, self.pos)
+        if match is None or match.group(0) != word:
+            return False
+        self.pos = match.end()
+        return True
+
+    def skip_parens(self):
+        # Import and export lists, which may nest like `Maybe(..)` or `(<>)`
+        depth = 0
+        while self.pos < len(self.text):
+            c = self.text[self.pos]
+            if c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+                if depth == 0:
+                    self.pos += 1
+                    return
+            elif c == '-' or c == '{':
+                start = self.pos
+                self.skip_trivia()
+                if self.pos != start:
+                    continue
+            self.pos += 1
+
+
+def parse_header(text):
+    # Returns (module info, offset where the header ends) or None, where
+    # module info has the shape of the `list import` command of purs ide:
+    # {'moduleName': 'Main',
+    #  'imports': [{'module': 'Prelude', 'importType': 'implicit', 'qualifier': None}]}
+    scanner = HeaderScanner(text)
+    if not scanner.accept_word('module'):
+        return None
+    module_name = scanner.read_name()
+    if module_name is None:
+        return None
+    scanner.skip_trivia()
+    if scanner.peek() == '(':
+        scanner.skip_parens()
+    if not scanner.accept_word('where'):
+        return None
+
+    imports = []
+    while True:
+        scanner.skip_trivia()
+        header_end = scanner.pos
+        if not scanner.accept_word('import'):
+            break
+        module = scanner.read_name()
+        if module is None:
+            scanner.pos = header_end
+            break
+
+        import_type = 'implicit'
+        if scanner.accept_word('hiding'):
+            import_type = 'hiding'
+        scanner.skip_trivia()
+        if scanner.peek() == '(':
+            scanner.skip_parens()
+            if import_type == 'implicit':
+                import_type = 'explicit'
+        qualifier = None
+        if scanner.accept_word('as'):
+            qualifier = scanner.read_name()
+        imports.append({'module': module, 'importType': import_type, 'qualifier': qualifier})
+
+    return ({'moduleName': module_name, 'imports': imports}, header_end)
@@ -0,0 +1,212 @@
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+
+class ModuleIndex(object):
+    """Case insensitive prefix index over the module names of a project
+
+    Names are kept sorted by their lower-cased form, so a prefix lookup is
+    a binary search followed by a walk over the matching range only.
+    """
+    def __init__(self, modules=[]):
+        super().__init__()
+        pairs = sorted(set([(m.lower(), m) for m in modules]))
+        self.keys = [k for k, _ in pairs]
+        self.names = [m for _, m in pairs]
+        self.lock = threading.Lock()
+
+    def add(self, module):
+        key = module.lower()
+        with self.lock:
+            i = bisect_left(self.keys, key)
+            while i < len(self.keys) and self.keys[i] == key:
+                if self.names[i] == module:
+                    return
+                i += 1
+            self.keys.insert(i, key)
+            self.names.insert(i, module)
+
+    def remove(self, module):
+        key = module.lower()
+        with self.lock:
+            i = bisect_left(self.keys, key)
+            while i < len(self.keys) and self.keys[i] == key:
+                if self.names[i] == module:
+                    del self.keys[i]
+                    del self.names[i]
+                    return
+                i += 1
+
+    def starting_with(self, prefix):
+        key = prefix.lower()
+        with self.lock:
+            i = bisect_left(self.keys, key)
+            result = []
+            while i < len(self.keys) and self.keys[i].startswith(key):
+                result.append(self.names[i])
+                i += 1
+            return result
+
+    def __len__(self):
+        return len(self.names)
+
+
+class IntervalIndex(object):
+    """Point queries over closed intervals (begin, end, value)
+
+    The bounds of all intervals cut the line into segments, and for each
+    segment the innermost interval covering it, the one beginning last and
+    then ending first, is found once by a sweep when the index is built.
+    A query is then a single binary search over the segments, however
+    many intervals overlap. Intervals are also kept sorted by begin for
+    walking from one to the next.
+    """
+    def __init__(self, intervals=[]):
+        super().__init__()
+        self.intervals = sorted(intervals, key=lambda x: (x[0], x[1]))
+        self.begins = [i[0] for i in self.intervals]
+
+        # A bound is (x, 0) right at x, or (x, 1) right after x, so that
+        # the closed end of an interval is where its last segment stops
+        bounds = sorted(set([(b, 0) for b, _, _ in self.intervals] +
+                            [(e, 1) for _, e, _ in self.intervals]))
+        # Segment j runs from segment_starts[j] up to the next start
+        self.segment_starts = []
+        self.segment_values = []
+        active = []
+        i = 0
+        for bound in bounds:
+            while i < len(self.intervals) and (self.intervals[i][0], 0) <= bound:
+                heapq.heappush(active, (-self.intervals[i][0], self.intervals[i][1], i))
+                i += 1
+            # Ended intervals are only dropped once they come to the top
+            while len(active) > 0 and (active[0][1], 1) <= bound:
+                heapq.heappop(active)
+            self.segment_starts.append(bound)
+            self.segment_values.append(active[0][2] if len(active) > 0 else None)
+
+    def at(self, point):
+        # The value of the innermost interval containing point
+        j = bisect_right(self.segment_starts, (point, 0)) - 1
+        if j < 0 or self.segment_values[j] is None:
+            return None
+        return self.intervals[self.segment_values[j]][2]
+
+    def next_after(self, point):
+        i = bisect_right(self.begins, point)
+        if i >= len(self.intervals):
+            return None
+        return self.intervals[i]
+
+    def previous_before(self, point):
+        i = bisect_left(self.begins, point) - 1
+        if i < 0:
+            return None
+        return self.intervals[i]
+
+    def first(self):
+        return self.intervals[0] if len(self.intervals) > 0 else None
+
+    def last(self):
+        return self.intervals[-1] if len(self.intervals) > 0 else None
+
+    def __len__(self):
+        return len(self.intervals)
+
+
+class ImportGraph(object):
+    """Imports between the modules of a project, kept in both directions"""
+    def __init__(self):
+        super().__init__()
+        # module -> set of modules it imports
+        self.imports = {}
+        # module -> set of modules importing it
+        self.importers = {}
+        self.lock = threading.Lock()
+
+    def set_imports(self, module, imported_modules):
+        with self.lock:
+            for m in self.imports.get(module, set()):
+                self.importers.get(m, set()).discard(module)
+            self.imports[module] = set(imported_modules)
+            for m in self.imports[module]:
+                self.importers.setdefault(m, set()).add(module)
+
+    def dependents(self, module):
+        # Every module importing module, directly or not
+        with self.lock:
+            found = set()
+            queue = [module]
+            while len(queue) > 0:
+                for m in self.importers.get(queue.pop(), set()):
+                    if m not in found and m != module:
+                        found.add(m)
+                        queue.append(m)
+            return found
+
+    def topological_order(self, modules):
+        # Order modules so that each comes after the ones it imports,
+        # only looking at imports among the given modules
+        with self.lock:
+            modules = set(modules)
+            remaining = dict([ (m, self.imports.get(m, set()) & modules)
+                               for m in modules ])
+        ordered = []
+        while len(remaining) > 0:
+            ready = sorted([m for m, deps in remaining.items() if len(deps) == 0])
+            if len(ready) == 0:
+                # Import cycle, the compiler reports it, just keep going
+                ready = sorted(remaining.keys())[:1]
+            for m in ready:
+                ordered.append(m)
+                del remaining[m]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return ordered
+
+
+PROJECT_MARKERS = ["psc-package.json", "package.json", "packages.dhall", "spago.dhall"]
+
+class ProjectRootIndex(object):
+    """Remember which directories contain a project marker file
+
+    Lookups are answered from memory. An entry older than `max_age` seconds
+    is re-checked with a single stat of the directory, whose mtime changes
+    when a marker file appears or disappears, and only listed again when
+    it did change. `invalidate` drops an entry right away.
+    """
+    def __init__(self):
+        super().__init__()
+        # directory -> (has marker, directory mtime, checked at)
+        self.directories = {}
+        self.lock = threading.Lock()
+
+    def has_marker(self, directory, max_age=5.0):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.directories.get(directory, None)
+        if entry is not None and now - entry[2] < max_age:
+            return entry[0]
+
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            mtime = None
+        if entry is not None and entry[1] == mtime:
+            found = entry[0]
+        else:
+            try:
+                files = os.listdir(directory)
+            except OSError:
+                files = []
+            found = any([m in files for m in PROJECT_MARKERS])
+        with self.lock:
+            self.directories[directory] = (found, mtime, now)
+        return found
+
+    def invalidate(self, directory):
+        with self.lock:
+            self.directories.pop(directory, None)
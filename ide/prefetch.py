@@ -0,0 +1,92 @@
+import re
+import threading
+import time
+
+from .command import ( get_type
+                     , is_type_cached
+                     , servers
+                     )
+from .utility import ( find_project_dir
+                     , view_module_header
+                     )
+
+
+# Optionally qualified identifiers, like `map`, `Maybe` or `A.head`
+IDENTIFIER_RE = re.compile(r"\b(?:[A-Z][\w']*\.)*[A-Za-z_][\w']*")
+KEYWORDS = set([ 'ado', 'as', 'case', 'class', 'data', 'derive', 'do', 'else'
+               , 'false', 'forall', 'foreign', 'hiding', 'if', 'import', 'in'
+               , 'infix', 'infixl', 'infixr', 'instance', 'let', 'module'
+               , 'newtype', 'of', 'then', 'true', 'type', 'where'
+               ])
+
+
+def imported_modules_for(module_info, qualifier):
+    imported_modules = [m['module'] for m in module_info['imports']]
+    if qualifier is not None:
+        # Only look into the modules imported with this qualifier
+        qualified_modules = [ m['module'] for m in module_info['imports']
+                              if m.get('qualifier') == qualifier ]
+        if len(qualified_modules) > 0:
+            imported_modules = qualified_modules
+    return imported_modules
+
+
+class TypePrefetcher(object):
+    """Look up the types of the identifiers visible in a view ahead of hover
+
+    Lookups go one at a time through get_type, which fills the hover cache,
+    at most `type_prefetch_rate` per second. Identifiers that are cached
+    already are skipped. Starting a new prefetch or calling `cancel` stops
+    the previous one before its next lookup.
+    """
+    def __init__(self):
+        super().__init__()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+
+    def is_current(self, generation):
+        with self.lock:
+            return generation == self.generation
+
+    def prefetch(self, view, region, rate=20, limit=200):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        threading.Thread(
+            target=lambda: self.run(view, region, generation, rate, limit)
+        ).start()
+
+    def run(self, view, region, generation, rate, limit):
+        project_path = find_project_dir(view)
+        if project_path not in servers:
+            return
+        module_info = view_module_header(view)
+        if module_info is None:
+            return
+
+        words = []
+        seen = set()
+        for qualified in IDENTIFIER_RE.findall(view.substr(region)):
+            if qualified in seen:
+                continue
+            seen.add(qualified)
+            parts = qualified.split('.')
+            if parts[-1] in KEYWORDS:
+                continue
+            words.append(('.'.join(parts[:-1]) or None, parts[-1]))
+            if len(words) >= limit:
+                break
+
+        interval = 1.0 / max(rate, 1)
+        for qualifier, word in words:
+            if not self.is_current(generation):
+                return
+            imported_modules = imported_modules_for(module_info, qualifier)
+            if is_type_cached(project_path, module_info['moduleName'], word, imported_modules):
+                continue
+            get_type(project_path, module_info['moduleName'], word, imported_modules)
+            time.sleep(interval)
@@ -0,0 +1,167 @@
+import io
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from functools import wraps
+
+import sublime
+
+try:
+    import cProfile
+    import pstats
+except ImportError:
+    # Not every Python build Sublime Text ships has them,
+    # stacks are sampled instead
+    cProfile = None
+
+from .settings import get_settings
+from .stats import Histogram
+
+
+# handler name -> Histogram of milliseconds
+handler_times = {}
+handler_times_lock = threading.Lock()
+# Only the outermost profiled call of a thread is profiled
+profiling_state = threading.local()
+
+profile_logger = None
+profile_logger_lock = threading.Lock()
+
+def get_profile_logger():
+    # Slow calls go to a file that rotates at 1MB, keeping 3 old ones
+    global profile_logger
+    with profile_logger_lock:
+        if profile_logger is None:
+            directory = os.path.join(sublime.cache_path(), 'purescript-ide')
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(directory, 'profile.log'),
+                maxBytes=1024*1024,
+                backupCount=3,
+                encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            profile_logger = logging.getLogger('purescript-ide.profile')
+            profile_logger.propagate = False
+            profile_logger.setLevel(logging.INFO)
+            profile_logger.addHandler(handler)
+        return profile_logger
+
+
+class StackSampler(threading.Thread):
+    """Count the stacks of another thread every `interval` seconds"""
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__()
+        self.daemon = True
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id, None)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            self.stacks[tuple(['%s:%d %s' % (f[0], f[1], f[2]) for f in stack])] += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+    def report(self, limit=5):
+        lines = []
+        for stack, count in self.stacks.most_common(limit):
+            lines.append('%d samples' % count)
+            lines += ['  ' + line for line in stack[-15:]]
+        return '\n'.join(lines)
+
+
+def view_of(args):
+    # The view a handler was called for, ViewEventListener handlers have it
+    # on self, EventListener handlers take it as the first argument
+    for arg in args[:2]:
+        view = getattr(arg, 'view', arg)
+        if hasattr(view, 'file_name'):
+            return view
+    return None
+
+
+def profiled(f):
+    """Time every call of an event handler when enable_profiling is on
+
+    Calls slower than profiling_threshold milliseconds are written to the
+    profile log with a cProfile summary, or sampled stacks when cProfile
+    is not available.
+    """
+    name = f.__qualname__
+
+    @wraps(f)
+    def wrapped(*args, **kwds):
+        if not get_settings('enable_profiling', False) or getattr(profiling_state, 'active', False):
+            return f(*args, **kwds)
+
+        profiling_state.active = True
+        if cProfile is not None:
+            profiler = cProfile.Profile()
+            sampler = None
+        else:
+            profiler = None
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                return profiler.runcall(f, *args, **kwds)
+            return f(*args, **kwds)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            profiling_state.active = False
+            if sampler is not None:
+                sampler.stop()
+            record_call(name, elapsed, args, profiler, sampler)
+    return wrapped
+
+
+def record_call(name, elapsed, args, profiler, sampler):
+    with handler_times_lock:
+        histogram = handler_times.get(name, None)
+        if histogram is None:
+            histogram = Histogram()
+            handler_times[name] = histogram
+        histogram.add(elapsed)
+
+    if elapsed < get_settings('profiling_threshold', 50):
+        return
+    view = view_of(args)
+    file_name = None if view is None else view.file_name()
+    if profiler is not None:
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(20)
+        details = output.getvalue()
+    else:
+        details = sampler.report()
+    try:
+        get_profile_logger().info('%s took %.1fms on %s\n%s', name, elapsed, file_name, details)
+    except (IOError, OSError):
+        pass
+
+
+def handler_report():
+    def ms(value):
+        return '-' if value is None else '%.1f' % value
+
+    with handler_times_lock:
+        lines = []
+        for name, h in sorted(handler_times.items()):
+            lines.append('  %-48s %7d  %s  max %s' % (
+                name, h.count,
+                '/'.join([ms(h.percentile(f)) for f in [0.5, 0.95, 0.99]]),
+                ms(h.max)))
+        return lines
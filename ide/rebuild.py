@@ -1,98 +1,379 @@
 import sublime
 import sublime_plugin
-from .command import rebuild
+import json
+import os
+import threading
+from .command import ( rebuild
+                     , rebuild_with_status
+                     , remember_module_name
+                     , get_purs_path
+                     , spawn_command
+                     , log
+                     )
 from .error import error_manager
+from .index import ImportGraph
+from .profiling import profiled
+from .scheduler import rebuild_scheduler
+from .settings import get_settings
 
 from .utility import ( find_project_dir
                      , ignore_non_purescript
+                     , write_scratch_file
+                     , remove_scratch_file
+                     , project_views
+                     , view_module_header
                      )
 
+
+# Path: ImportGraph
+import_graphs = {}
+
+def import_graph(project_path):
+    graph = import_graphs.get(project_path, None)
+    if graph is None:
+        graph = ImportGraph()
+        import_graphs[project_path] = graph
+    return graph
+
+
+# {view id: PhantomSet}
+phantom_sets = {}
+
+def show_errors(view, file_name, errors):
+    if not view.is_valid() or errors is None:
+        return
+
+    regions_and_errors = []
+    regions = []
+    error_without_position = []
+    for error in errors:
+        # it's possible to have error with no position like this
+        #
+        # {'suggestion': None,
+        # 'position': None,
+        # 'errorCode': 'UnusableDeclaration',
+        # 'moduleName': 'Localization.Smolder',
+        # 'errorLink': 'https://github.com/purescript/documentation/blob/master/errors/UnusableDeclaration.md',
+        # 'message': "  The declaration withEvent is unusable.\n  This happens when a constraint couldn't possibly have enough information to work out which instance is required.\n",
+        # 'filename': None
+        # }
+        if error['position'] is None:
+            print(error)
+            error_without_position.append(error)
+            continue
+        start = view.text_point(
+            error['position']['startLine']-1,
+            error['position']['startColumn']-1
+        )
+        end = view.text_point(
+            error['position']['endLine']-1,
+            error['position']['endColumn']-1
+        )
+        region = sublime.Region(start, end+1)
+
+        if region.size() <= 1:
+            # try to make the region bigger because
+            # zero width region is invisible
+            region = view.word(start)
+
+        regions_and_errors.append((region, error))
+        regions.append(region)
+
+    # The actual "hover -> show popup" effect is handled in text_hints.py
+    error_manager.set_errors(file_name, regions_and_errors)
+    view.add_regions("errors", regions,
+        "invalid.illegal",
+
+        # This thing does not exist in doc, but it exists in the default theme.
+        # It might break some days
+        "warning",
+
+        sublime.DRAW_NO_FILL |
+        sublime.DRAW_NO_OUTLINE |
+        sublime.DRAW_SQUIGGLY_UNDERLINE
+        )
+
+    ps = sublime.PhantomSet(view)
+
+    ps.update([sublime.Phantom(
+                view.sel()[0],
+                "".join(['<p>%s</p>' % s.replace(' ', '&nbsp;')
+                    for s in error['message']
+                        .split('\n')]),
+                sublime.LAYOUT_BLOCK) for error in error_without_position])
+
+    phantom_sets[view.id()] = ps
+
+
 class RebuildEventListener(sublime_plugin.EventListener):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.phantom_sets = [] # [(view, phantomset)]
+        self.live_generations = {} # {view id: int}
 
     @ignore_non_purescript
+    @profiled
     def on_post_save_async(self, view):
         file_name = view.file_name()
         if file_name is None:
             return
         project_path = find_project_dir(view)
-        errors = rebuild(project_path, file_name)
-
-        regions_and_errors = []
-        regions = []
-        error_without_position = []
-        for error in errors:
-            # it's possible to have error with no position like this
-            #
-            # {'suggestion': None,
-            # 'position': None,
-            # 'errorCode': 'UnusableDeclaration',
-            # 'moduleName': 'Localization.Smolder',
-            # 'errorLink': 'https://github.com/purescript/documentation/blob/master/errors/UnusableDeclaration.md',
-            # 'message': "  The declaration withEvent is unusable.\n  This happens when a constraint couldn't possibly have enough information to work out which instance is required.\n",
-            # 'filename': None
-            # }
-            if error['position'] is None:
-                print(error)
-                error_without_position.append(error)
+        scheduler = rebuild_scheduler(project_path)
+        change_count = view.change_count()
+
+        def callback(result):
+            if result is None:
+                return
+            success, errors = result
+            log('rebuild', file_name, scheduler.stats())
+            sublime.set_timeout(lambda: show_errors(view, file_name, errors), 0)
+            if success and get_settings('rebuild_dependents', True):
+                self.rebuild_dependents(project_path, file_name)
+
+        if get_settings('rebuild_mode', 'fast') != 'fast':
+            # Saving the same file again before this one finishes replaces it
+            scheduler.schedule(
+                file_name,
+                lambda: rebuild_with_status(project_path, file_name),
+                callback)
+            return
+
+        # Typecheck only, so that errors show up as soon as possible
+        scheduler.schedule(
+            file_name,
+            lambda: rebuild_with_status(project_path, file_name, codegen=[]),
+            callback)
+
+        def codegen_callback(errors):
+            # Codegen can report more errors (e.g. missing foreign module),
+            # they still apply if the buffer is unchanged since the save
+            if view.change_count() == change_count:
+                sublime.set_timeout(lambda: show_errors(view, file_name, errors), 0)
+
+        # Generate code later, when the project has been quiet for a while
+        scheduler.schedule_when_idle(
+            (file_name, 'codegen'),
+            lambda: rebuild(project_path, file_name, codegen=['js']),
+            codegen_callback)
+
+    @ignore_non_purescript
+    @profiled
+    def on_modified_async(self, view):
+        # Rebuild the unsaved buffer once typing pauses
+        delay = get_settings('live_rebuild_delay', 1000)
+        if not delay or view.file_name() is None:
+            return
+        generation = self.live_generations.get(view.id(), 0) + 1
+        self.live_generations[view.id()] = generation
+        sublime.set_timeout_async(lambda: self.live_rebuild(view, generation), delay)
+
+    def live_rebuild(self, view, generation):
+        if self.live_generations.get(view.id(), None) != generation:
+            # Still typing
+            return
+        if not view.is_valid() or not view.is_dirty():
+            return
+        self.schedule_buffer_rebuild(view, find_project_dir(view))
+
+    def schedule_buffer_rebuild(self, view, project_path):
+        file_name = view.file_name()
+
+        def perform():
+            change_count = view.change_count()
+            scratch_file = write_scratch_file(view)
+            errors = rebuild(project_path, scratch_file, codegen=[], actual_file=file_name)
+            return (change_count, errors)
+
+        def callback(result):
+            if result is None:
+                return
+            change_count, errors = result
+            def show():
+                # Positions only make sense for the text that was rebuilt
+                if view.change_count() == change_count:
+                    show_errors(view, file_name, errors)
+            sublime.set_timeout(show, 0)
+
+        # Shares the key with saving, so either replaces a stale other
+        rebuild_scheduler(project_path).schedule(file_name, perform, callback)
+
+    def schedule_file_rebuild(self, view, project_path):
+        file_name = view.file_name()
+        rebuild_scheduler(project_path).schedule(
+            file_name,
+            lambda: rebuild(project_path, file_name, codegen=[]),
+            lambda errors: sublime.set_timeout(lambda: show_errors(view, file_name, errors), 0))
+
+    def rebuild_dependents(self, project_path, file_name):
+        # Modules importing the rebuilt one keep stale errors until they are
+        # rebuilt too, do that for the open ones, imported modules first
+        graph = import_graph(project_path)
+        views = {}
+        module_name = None
+        for view in project_views(project_path):
+            module_info = view_module_header(view)
+            if module_info is None:
                 continue
-            start = view.text_point(
-                error['position']['startLine']-1,
-                error['position']['startColumn']-1
-            )
-            end = view.text_point(
-                error['position']['endLine']-1,
-                error['position']['endColumn']-1
-            )
-            region = sublime.Region(start, end+1)
-
-            if region.size() <= 1:
-                # try to make the region bigger because
-                # zero width region is invisible
-                region = view.word(start)
-
-            regions_and_errors.append((region, error))
-            regions.append(region)
-
-        # The actual "hover -> show popup" effect is handled in text_hints.py
-        error_manager.set_errors(file_name, regions_and_errors)
-        view.add_regions("errors", regions,
-            "invalid.illegal",
-
-            # This thing does not exist in doc, but it exists in the default theme.
-            # It might break some days
-            "warning",
-
-            sublime.DRAW_NO_FILL |
-            sublime.DRAW_NO_OUTLINE |
-            sublime.DRAW_SQUIGGLY_UNDERLINE
-            )
-
-        ps = sublime.PhantomSet(view)
-
-        ps.update([sublime.Phantom(
-                    view.sel()[0],
-                    "".join(['<p>%s</p>' % s.replace(' ', '&nbsp;')
-                        for s in error['message']
-                            .split('\n')]),
-                    sublime.LAYOUT_BLOCK) for error in error_without_position])
-
-        self.delete_phantom_in_view(view)
-        self.phantom_sets.append((view, ps))
+            graph.set_imports(
+                module_info['moduleName'],
+                [i['module'] for i in module_info['imports']])
+            if view.file_name() == file_name:
+                module_name = module_info['moduleName']
+            else:
+                views[module_info['moduleName']] = view
+        if module_name is None:
+            return
+
+        dependents = graph.dependents(module_name) & set(views.keys())
+        for m in graph.topological_order(dependents):
+            view = views[m]
+            if view.is_dirty():
+                self.schedule_buffer_rebuild(view, project_path)
+            else:
+                self.schedule_file_rebuild(view, project_path)
+
+    @ignore_non_purescript
+    def on_load(self, view):
+        # Errors found by a project build before the file was opened
+        errors = error_manager.take_unrendered_errors(view.file_name())
+        if errors is not None:
+            show_errors(view, view.file_name(), errors)
+
+    @ignore_non_purescript
+    def on_activated_async(self, view):
+        # Views restored with the session are never loaded, but activated
+        # before they are edited, which is early enough to know what
+        # module a file held before it is renamed
+        file_name = view.file_name()
+        if file_name is None:
+            return
+        module_info = view_module_header(view)
+        if module_info is not None:
+            remember_module_name(find_project_dir(view), file_name, module_info['moduleName'])
 
     @ignore_non_purescript
     def on_close(self, view):
-        self.delete_phantom_in_view(view)
-
-    def delete_phantom_in_view(self, view):
-        i = 0
-        index = None
-        for (v, _) in self.phantom_sets:
-            if v == view:
-                index = i
-            i += 1
-        if index is not None:
-            del self.phantom_sets[index]
+        phantom_sets.pop(view.id(), None)
+        self.live_generations.pop(view.id(), None)
+        remove_scratch_file(view)
+
+
+BUILD_PANEL = 'purescript_build'
+running_builds = set()
+
+def default_build_command():
+    return [ get_purs_path() or 'purs', 'compile', '--json-errors'
+           , 'src/**/*.purs'
+           , 'test/**/*.purs'
+           , '.spago/*/*/src/**/*.purs'
+           , 'bower_components/purescript-*/src/**/*.purs'
+           ]
+
+
+def parse_json_errors(line):
+    # purs prints {"warnings": [...], "errors": [...]} on a line of its own,
+    # everything else is progress output
+    if not line.lstrip().startswith('{'):
+        return None
+    try:
+        result = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(result, dict) or 'errors' not in result:
+        return None
+    return result
+
+
+def format_error(error, kind):
+    message = error['message'].strip().split('\n')[0].strip()
+    if error.get('position') is None:
+        return '%s %s: %s' % (kind, error['errorCode'], message)
+    return '%s:%d:%d: %s %s: %s' % (
+        error['filename'],
+        error['position']['startLine'],
+        error['position']['startColumn'],
+        kind,
+        error['errorCode'],
+        message)
+
+
+class PurescriptBuildProjectCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        view = self.window.active_view()
+        project_path = None if view is None else find_project_dir(view)
+        if project_path is None:
+            self.window.status_message('Not in a PureScript project')
+            return
+        if project_path in running_builds:
+            self.window.status_message('Already building ' + project_path)
+            return
+
+        panel = self.window.create_output_panel(BUILD_PANEL)
+        panel.settings().set('result_file_regex', r'^(.+?):(\d+):(\d+): (.*)$')
+        panel.settings().set('result_base_dir', project_path)
+        self.window.run_command('show_panel', {'panel': 'output.' + BUILD_PANEL})
+
+        running_builds.add(project_path)
+        threading.Thread(target=lambda: self.build(project_path, panel)).start()
+
+    def build(self, project_path, panel):
+        def append(text):
+            sublime.set_timeout(lambda: panel.run_command(
+                'append',
+                {'characters': text, 'force': True, 'scroll_to_end': True}), 0)
+
+        command = get_settings('build_command', None) or default_build_command()
+        append('Running: %s\n' % ' '.join(command))
+        # Errors of closed files from an earlier build may be fixed by now
+        error_manager.clear_unrendered_errors(project_path)
+        reported_files = set()
+        error_count = 0
+        try:
+            proc = spawn_command(command, cwd=project_path)
+        except (OSError, ValueError) as e:
+            running_builds.discard(project_path)
+            append('Cannot run %s: %s\n' % (command[0], e))
+            sublime.set_timeout(lambda: self.window.status_message(
+                'PureScript build could not be started'), 0)
+            return
+        try:
+            # Output is handled line by line as purs emits it
+            for line in iter(proc.stdout.readline, b''):
+                line = line.decode('utf-8', 'replace')
+                result = parse_json_errors(line)
+                if result is None:
+                    append(line)
+                    continue
+                errors_by_file = {}
+                for kind in ['error', 'warning']:
+                    for error in result[kind + 's']:
+                        if kind == 'error':
+                            error_count += 1
+                        append(format_error(error, kind) + '\n')
+                        if error.get('filename') is None:
+                            continue
+                        file_name = os.path.normpath(os.path.join(project_path, error['filename']))
+                        errors_by_file.setdefault(file_name, []).append(error)
+                for file_name, errors in errors_by_file.items():
+                    reported_files.add(file_name)
+                    self.report_errors(file_name, errors)
+            exit_int = proc.wait()
+        finally:
+            running_builds.discard(project_path)
+
+        # Open files without errors may still show ones from earlier rebuilds
+        for view in project_views(project_path):
+            if view.file_name() not in reported_files:
+                self.report_errors(view.file_name(), [])
+
+        append('Finished with %d error(s), exit code %s\n' % (error_count, exit_int))
+        sublime.set_timeout(lambda: self.window.status_message(
+            'PureScript build finished with %d error(s)' % error_count), 0)
+
+    def report_errors(self, file_name, errors):
+        for window in sublime.windows():
+            view = window.find_open_file(file_name)
+            if view is not None:
+                sublime.set_timeout(lambda: show_errors(view, file_name, errors), 0)
+                return
+        error_manager.set_unrendered_errors(file_name, errors)
@@ -0,0 +1,154 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+
+from .settings import get_settings
+
+
+class RebuildJob(object):
+    def __init__(self, key, perform, callback):
+        super().__init__()
+        self.key = key
+        # perform :: () -> result, runs on a worker thread
+        self.perform = perform
+        # callback :: result -> (), skipped when superseded
+        self.callback = callback
+        self.queued_at = time.monotonic()
+        self.superseded = False
+
+
+class RebuildScheduler(object):
+    """Run the rebuilds of a project in the background
+
+    Jobs are keyed, usually by file path. Scheduling a key that is already
+    queued replaces the queued job, so save-all or format-on-save rebuild
+    a file once. Scheduling a key that is running marks the running job as
+    superseded: its result is dropped and the new job runs after it. At
+    most `max_concurrency` jobs talk to the server at the same time.
+
+    Jobs scheduled with `schedule_when_idle` wait until nothing else has
+    been scheduled or run for `idle_delay` seconds.
+    """
+    def __init__(self, max_concurrency=1, idle_delay=3):
+        super().__init__()
+        self.max_concurrency = max(1, max_concurrency)
+        self.pending = OrderedDict()
+        self.running = {}
+        self.workers = 0
+        self.idle_jobs = OrderedDict()
+        self.idle_delay = idle_delay
+        self.idle_timer = None
+        self.lock = threading.Lock()
+        # Seconds from being queued to having a result
+        self.latencies = deque(maxlen=100)
+        self.completed = 0
+        self.dropped = 0
+
+    def schedule(self, key, perform, callback):
+        with self.lock:
+            self.pending[key] = RebuildJob(key, perform, callback)
+            if key in self.running:
+                self.running[key].superseded = True
+            start_worker = self.reserve_worker()
+        if start_worker:
+            threading.Thread(target=self.work).start()
+        # Any activity postpones the idle jobs
+        self.restart_idle_timer()
+
+    def schedule_when_idle(self, key, perform, callback):
+        with self.lock:
+            self.idle_jobs[key] = RebuildJob(key, perform, callback)
+        self.restart_idle_timer()
+
+    def reserve_worker(self):
+        if self.workers >= self.max_concurrency:
+            return False
+        self.workers += 1
+        return True
+
+    def restart_idle_timer(self):
+        with self.lock:
+            if self.idle_timer is not None:
+                self.idle_timer.cancel()
+                self.idle_timer = None
+            if len(self.idle_jobs) == 0:
+                return
+            self.idle_timer = threading.Timer(self.idle_delay, self.on_idle)
+            self.idle_timer.daemon = True
+            self.idle_timer.start()
+
+    def on_idle(self):
+        with self.lock:
+            busy = len(self.pending) > 0 or len(self.running) > 0
+            if not busy:
+                for key, job in self.idle_jobs.items():
+                    self.pending[key] = job
+                self.idle_jobs.clear()
+                start_worker = self.reserve_worker()
+        if busy:
+            self.restart_idle_timer()
+        elif start_worker:
+            threading.Thread(target=self.work).start()
+
+    def next_job(self):
+        for key, job in self.pending.items():
+            # Never run the same key twice at once, the worker
+            # running it will pick the new job up afterwards
+            if key not in self.running:
+                del self.pending[key]
+                self.running[key] = job
+                return job
+        return None
+
+    def work(self):
+        while True:
+            with self.lock:
+                job = self.next_job()
+                if job is None:
+                    self.workers -= 1
+                    return
+
+            try:
+                result = job.perform()
+            except Exception:
+                traceback.print_exc()
+                result = None
+
+            with self.lock:
+                del self.running[job.key]
+                if job.superseded:
+                    self.dropped += 1
+                    continue
+                self.completed += 1
+                self.latencies.append(time.monotonic() - job.queued_at)
+            job.callback(result)
+
+    def queue_depth(self):
+        with self.lock:
+            return len(self.pending)
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            return { 'queued': len(self.pending)
+                   , 'running': len(self.running)
+                   , 'waiting_for_idle': len(self.idle_jobs)
+                   , 'completed': self.completed
+                   , 'dropped': self.dropped
+                   , 'last_latency': latencies[-1] if len(latencies) > 0 else None
+                   , 'average_latency': sum(latencies) / len(latencies) if len(latencies) > 0 else None
+                   }
+
+
+# Path: RebuildScheduler
+rebuild_schedulers = {}
+
+def rebuild_scheduler(project_path):
+    scheduler = rebuild_schedulers.get(project_path, None)
+    if scheduler is None:
+        scheduler = RebuildScheduler(
+            get_settings('max_concurrent_rebuilds', 1),
+            get_settings('codegen_idle_delay', 3))
+        rebuild_schedulers[project_path] = scheduler
+    return scheduler
@@ -1,11 +1,23 @@
+import os
 import sublime
 import sublime_plugin
 
 from .command import ( start_server
                      , stop_server
+                     , servers
+                     , type_caches
                      )
+from .index import PROJECT_MARKERS
+from .profiling import handler_report, profiled
+from .scheduler import rebuild_schedulers
+from .settings import get_settings
+from .stats import request_stats, stats_enabled
 from .utility import ( find_project_dir
+                     , header_cache
                      , ignore_non_purescript
+                     , project_root_index
+                     , project_views
+                     , view_module_header
                      )
 
 
@@ -23,6 +35,7 @@ class StartServerEventListener(sublime_plugin.EventListener):
         self.start_server(view, project_dir)
 
     @ignore_non_purescript
+    @profiled
     def on_activated(self, view):
         # It is possible that a view does not have window
         # (When user's choosing files from the command-p menu)
@@ -40,9 +53,13 @@ class StartServerEventListener(sublime_plugin.EventListener):
         window = view.window()
         def callback(message):
             window.status_message(message)
-        start_server(project_dir, on_message=callback)
+        start_server(
+            project_dir,
+            on_message=callback,
+            priority_modules=lambda: open_project_modules(project_dir))
 
     @ignore_non_purescript
+    @profiled
     def on_pre_close(self, view):
         if view.file_name() is None:
             return
@@ -63,3 +80,79 @@ class StartServerEventListener(sublime_plugin.EventListener):
 
         # delay server closing for 0.5s, because we may be "switching" between files
         sublime.set_timeout(perform, 500)
+
+
+def open_project_modules(project_dir):
+    # Modules of the open .purs files in the project, followed by their imports
+    modules = []
+    imports = []
+    for view in project_views(project_dir):
+        module_info = view_module_header(view)
+        if module_info is None:
+            continue
+        modules.append(module_info['moduleName'])
+        imports += [i['module'] for i in module_info['imports']]
+    return modules + imports
+
+
+class ProjectRootEventListener(sublime_plugin.EventListener):
+    # Marker files are not purescript, so this is not filtered by syntax
+
+    def on_post_save_async(self, view):
+        self.invalidate(view)
+
+    def on_close(self, view):
+        self.invalidate(view)
+
+    def invalidate(self, view):
+        file_name = view.file_name()
+        if file_name is None:
+            return
+        if os.path.basename(file_name) in PROJECT_MARKERS:
+            project_root_index.invalidate(os.path.dirname(file_name))
+
+
+class PurescriptShowServerLogCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        view = self.window.active_view()
+        project_dir = None if view is None else find_project_dir(view)
+        server = servers.get(project_dir, None)
+        if server is None:
+            self.window.status_message('purs ide server is not running for this project')
+            return
+
+        panel = self.window.create_output_panel('purescript_server_log')
+        panel.run_command('append', {'characters': '\n'.join(server.output_tail()) + '\n'})
+        self.window.run_command('show_panel', {'panel': 'output.purescript_server_log'})
+
+
+class PurescriptShowStatsCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        lines = ['purs ide requests, times in milliseconds']
+        if not stats_enabled():
+            lines.append('Not recorded, set "enable_stats" to true to record them')
+        lines += request_stats.report()
+
+        lines += ['', 'Event handlers, times in milliseconds p50/p95/p99']
+        if not get_settings('enable_profiling', False):
+            lines.append('Not recorded, set "enable_profiling" to true to record them')
+        lines += handler_report()
+
+        lines += ['', 'Rebuilds, latencies in seconds']
+        for project_path, scheduler in sorted(rebuild_schedulers.items()):
+            lines.append('  %s %s' % (project_path, format_stats(scheduler.stats())))
+
+        lines += ['', 'Caches']
+        for project_path, cache in sorted(type_caches.items()):
+            lines.append('  types %s %s' % (project_path, format_stats(cache.stats())))
+        lines.append('  module headers %s' % format_stats(header_cache.stats()))
+
+        panel = self.window.create_output_panel('purescript_stats')
+        panel.run_command('append', {'characters': '\n'.join(lines) + '\n'})
+        self.window.run_command('show_panel', {'panel': 'output.purescript_stats'})
+
+
+def format_stats(stats):
+    def format_value(value):
+        return '%.3f' % value if isinstance(value, float) else str(value)
+    return ', '.join(['%s: %s' % (k, format_value(v)) for k, v in sorted(stats.items())])
@@ -1,8 +1,35 @@
 import sublime
 
 SETTINGS_FILE = 'purescript-ide.sublime-settings'
-SETTING_KEYS = ['enable_debug_log', 'purs_path', 'port_starts_from', 'auto_complete_timeout']
+SETTING_KEYS = [ 'enable_debug_log'
+               , 'purs_path'
+               , 'port_starts_from'
+               , 'auto_complete_timeout'
+               , 'server_log_level'
+               , 'server_log_lines'
+               , 'server_start_timeout'
+               , 'load_batch_size'
+               , 'max_concurrent_rebuilds'
+               , 'rebuild_mode'
+               , 'codegen_idle_delay'
+               , 'live_rebuild_delay'
+               , 'rebuild_dependents'
+               , 'build_command'
+               , 'type_cache_size'
+               , 'hover_delay'
+               , 'enable_type_prefetch'
+               , 'type_prefetch_rate'
+               , 'type_prefetch_limit'
+               , 'auto_complete_fetch_size'
+               , 'project_root_check_interval'
+               , 'enable_warm_cache'
+               , 'enable_stats'
+               , 'enable_profiling'
+               , 'profiling_threshold'
+               ]
 settings = {}
+# Bumped whenever the settings are read again
+settings_generation = 0
 
 def plugin_loaded():
     update_settings()
@@ -15,7 +42,8 @@ def plugin_loaded():
 # and will hang when accessed from another thread.
 # So here is the code to clone the setting into a python dict.
 def update_settings():
-    global settings
+    global settings, settings_generation
+    settings_generation += 1
     raw_setting = sublime.load_settings(SETTINGS_FILE)
     for key in SETTING_KEYS:
         settings[key] = raw_setting.get(key)
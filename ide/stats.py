@@ -0,0 +1,135 @@
+import math
+import threading
+
+from .settings import get_settings
+
+
+def stats_enabled():
+    return get_settings('enable_stats', False)
+
+
+class Histogram(object):
+    """Counts of values in buckets that grow by a fixed factor
+
+    Memory does not grow with the number of values, and a percentile is
+    off by at most one bucket, that is 25%.
+    """
+    GROWTH = 1.25
+    SMALLEST = 0.01
+
+    def __init__(self):
+        super().__init__()
+        # bucket index -> count, bucket i holds values up to SMALLEST * GROWTH ** i
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        if value <= self.SMALLEST:
+            index = 0
+        else:
+            index = int(math.ceil(math.log(value / self.SMALLEST, self.GROWTH)))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        if self.count == 0:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index in sorted(self.buckets.keys()):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min(self.SMALLEST * self.GROWTH ** index, self.max)
+        return self.max
+
+    def mean(self):
+        return None if self.count == 0 else self.total / self.count
+
+
+class CommandStats(object):
+    """What the requests of one purs ide command cost, times in milliseconds
+
+    connect: until the server accepted the connection
+    server: from sending the request to the end of the response
+    decode: parsing the response
+    """
+    PHASES = ['total', 'connect', 'server', 'decode']
+
+    def __init__(self):
+        super().__init__()
+        self.times = dict([(phase, Histogram()) for phase in self.PHASES])
+        self.results = Histogram()
+        self.requests = 0
+        self.failures = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def record(self, timings, result):
+        self.requests += 1
+        if result is None:
+            self.failures += 1
+        for phase in self.PHASES:
+            if phase in timings:
+                self.times[phase].add(timings[phase] * 1000)
+        self.request_bytes += timings.get('request_bytes', 0)
+        self.response_bytes += timings.get('response_bytes', 0)
+        if result is not None and isinstance(result.get('result'), list):
+            self.results.add(len(result['result']))
+
+
+class RequestStats(object):
+    """Statistics of the requests sent to purs ide, per project and command"""
+    def __init__(self):
+        super().__init__()
+        # (project path, command) -> CommandStats
+        self.commands = {}
+        self.lock = threading.Lock()
+
+    def record(self, project_path, command, timings, result):
+        with self.lock:
+            key = (project_path, command)
+            stats = self.commands.get(key, None)
+            if stats is None:
+                stats = CommandStats()
+                self.commands[key] = stats
+            stats.record(timings, result)
+
+    def clear(self):
+        with self.lock:
+            self.commands.clear()
+
+    def report(self):
+        def ms(value):
+            return '-' if value is None else '%.1f' % value
+
+        lines = []
+        with self.lock:
+            keys = sorted(self.commands.keys(), key=lambda k: (k[0] or '', k[1]))
+            last_project = None
+            for project_path, command in keys:
+                stats = self.commands[(project_path, command)]
+                if project_path != last_project or len(lines) == 0:
+                    lines.append('')
+                    lines.append(project_path or '(no project)')
+                    lines.append('  %-10s %7s %7s  %-20s %-20s %-20s %-20s %9s %9s %8s' % (
+                        'command', 'count', 'failed', 'total p50/p95/p99',
+                        'connect p50/p95/p99', 'server p50/p95/p99', 'decode p50/p95/p99',
+                        'sent kB', 'recv kB', 'results'))
+                    last_project = project_path
+                columns = []
+                for phase in CommandStats.PHASES:
+                    h = stats.times[phase]
+                    columns.append('/'.join([ms(h.percentile(f)) for f in [0.5, 0.95, 0.99]]))
+                lines.append('  %-10s %7d %7d  %-20s %-20s %-20s %-20s %9.1f %9.1f %8s' % (
+                    command, stats.requests, stats.failures,
+                    columns[0], columns[1], columns[2], columns[3],
+                    stats.request_bytes / 1024.0, stats.response_bytes / 1024.0,
+                    ms(stats.results.mean())))
+        return lines
+
+
+request_stats = RequestStats()
@@ -1,6 +1,8 @@
 import sublime
 import sublime_plugin
 
+from .error import error_manager
+
 class ReplaceCommand(sublime_plugin.TextCommand):
     def run(self, edit, text):
         self.view.replace(
@@ -15,3 +17,25 @@ class ReplaceRegionCommand(sublime_plugin.TextCommand):
             edit,
             sublime.Region(start, end),
             text)
+
+
+class PurescriptGotoErrorCommand(sublime_plugin.TextCommand):
+    def run(self, edit, forward=True):
+        view = self.view
+        file_name = view.file_name()
+        if file_name is None:
+            return
+        point = view.sel()[0].begin() if len(view.sel()) > 0 else 0
+        if forward:
+            found = error_manager.next_error(file_name, point)
+        else:
+            found = error_manager.previous_error(file_name, point)
+        if found is None:
+            view.window().status_message('No errors in this file')
+            return
+
+        region, error = found
+        view.sel().clear()
+        view.sel().add(sublime.Region(region.begin()))
+        view.show_at_center(region)
+        view.window().status_message(error['message'].strip().split('\n')[0])
@@ -2,18 +2,62 @@ import sublime
 import sublime_plugin
 import webbrowser
 import html
+import threading
 
-from .command import ( get_module_imports
-                     , get_type )
+from .command import get_type
 from .utility import ( find_project_dir
                      , PurescriptViewEventListener
                      , module_word
+                     , view_module_header
                      )
 from .error import error_manager
+from .prefetch import ( TypePrefetcher
+                      , imported_modules_for
+                      )
+from .profiling import profiled
+from .settings import get_settings
 
 
 class TypeHintEventListener(PurescriptViewEventListener):
+    def __init__(self, *args, **kwargs):
+        super(TypeHintEventListener, self).__init__(*args, **kwargs)
+        # Bumped on every hover over a new word, lookups started for
+        # an older generation are stale and get discarded
+        self.hover_generation = 0
+        self.pending_hover_region = None
+        self.prefetcher = TypePrefetcher()
+        # Bumped when the view is activated or deactivated,
+        # stops the viewport polling of the previous activation
+        self.viewport_generation = 0
+
+    def on_activated_async(self):
+        if not get_settings('enable_type_prefetch', False):
+            return
+        if self.view.file_name() is None:
+            return
+        self.viewport_generation += 1
+        self.watch_viewport(self.viewport_generation, None)
+
+    def on_deactivated_async(self):
+        self.viewport_generation += 1
+        self.prefetcher.cancel()
 
+    def watch_viewport(self, generation, last_region):
+        # There is no scroll event, so poll the visible region while active
+        if generation != self.viewport_generation or not self.view.is_valid():
+            return
+        if not get_settings('enable_type_prefetch', False):
+            return
+        region = self.view.visible_region()
+        if region != last_region:
+            self.prefetcher.prefetch(
+                self.view,
+                region,
+                get_settings('type_prefetch_rate', 20),
+                get_settings('type_prefetch_limit', 200))
+        sublime.set_timeout_async(lambda: self.watch_viewport(generation, region), 500)
+
+    @profiled
     def on_hover(self, point, hover_zone):
         view = self.view
         file_name = view.file_name()
@@ -22,9 +66,49 @@ class TypeHintEventListener(PurescriptViewEventListener):
 
         error = error_manager.get_error_at_point(file_name, point)
         if error:
+            # A word hovered before must not open its popup over this one
+            self.hover_generation += 1
+            self.pending_hover_region = None
             self.show_error(view, error, point)
             return
-        self.show_type_hint(view, point)
+
+        word_region = view.word(point)
+        if self.pending_hover_region == word_region:
+            # Still resolving the same word
+            return
+        self.pending_hover_region = word_region
+        self.hover_generation += 1
+        generation = self.hover_generation
+        sublime.set_timeout_async(
+            lambda: self.resolve_type_hint(generation, point, word_region),
+            get_settings('hover_delay', 100))
+
+    def is_current_hover(self, generation):
+        return generation == self.hover_generation
+
+    def resolve_type_hint(self, generation, point, word_region):
+        if not self.is_current_hover(generation):
+            return
+
+        def perform():
+            type_info = self.lookup_type_hint(
+                self.view,
+                point,
+                lambda: not self.is_current_hover(generation))
+
+            def show():
+                if not self.is_current_hover(generation):
+                    return
+                self.pending_hover_region = None
+                # The text may have changed while waiting for the server
+                if type_info is None or self.view.word(point) != word_region:
+                    return
+                self.show_type_hint(self.view, point, type_info)
+            sublime.set_timeout(show, 0)
+
+        # Run the lookup on its own thread so a slow server does not hold
+        # up the async thread shared by every other event listener
+        threading.Thread(target=perform).start()
 
     def show_error(self, view, error, point):
         error_message_lines = error['message'].split('\n')
@@ -86,25 +170,27 @@ class TypeHintEventListener(PurescriptViewEventListener):
             600,
             handle_nav)
 
-    def show_type_hint(self, view, point):
-        project_path = find_project_dir(view)
-        module_info = get_module_imports(project_path, view.file_name())
+    def lookup_type_hint(self, view, point, is_cancelled=lambda: False):
         module, word = module_word(view, point)
         if word == '':
-            return
+            return None
         if word[0] == '(' and word[-1] == ')':
             word = word[1:-1]
 
-        # TODO: use module from module_word to improve accuracy
+        project_path = find_project_dir(view)
+        module_info = view_module_header(view)
+        if module_info is None or is_cancelled():
+            return None
+
         type_info = get_type(
             project_path,
             module_info['moduleName'],
             word,
-            [m['module'] for m in module_info['imports']]
+            imported_modules_for(module_info, module)
         )
-        if len(type_info) == 0:
-            return
+        return type_info or None
 
+    def show_type_hint(self, view, point, type_info):
         first_result = type_info[0]
 
         def on_navigate(string):
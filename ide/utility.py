@@ -1,8 +1,16 @@
 import sublime
 import sublime_plugin
 import os
+import shutil
+import tempfile
+import threading
 from functools import wraps
 
+from .cache import LRUCache
+from .imports import parse_header
+from .index import ProjectRootIndex
+from .settings import get_settings
+
 
 def first_starts_with(arr, element):
     for x in arr:
@@ -55,7 +63,7 @@ def module_word(view, point):
     return (module, last)
 
 
-project_path_cache = {}
+project_root_index = ProjectRootIndex()
 def find_project_dir(view):
     file_path = view.file_name()
     if file_path is None:
@@ -68,21 +76,143 @@ def find_project_dir(view):
     if project_folder is None:
         return None
 
-    target_folder = project_folder
+    max_age = get_settings('project_root_check_interval', 5)
     current_paths = file_path.split(os.sep)[:-1]
     while os.sep.join(current_paths).startswith(project_folder):
         current_path = os.sep.join(current_paths)
-        files = os.listdir(current_path)
-        if ("psc-package.json" in files) or ("package.json" in files) or ("packages.dhall" in files) or ("spago.dhall" in files):
-            target_folder = current_path
-            break
+        if project_root_index.has_marker(current_path, max_age):
+            return current_path
         current_paths = current_paths[:-1]
+    return project_folder
+
+
+# view id -> (change count, header text, module info, whether it runs to the end)
+header_cache = LRUCache(256)
+HEADER_CHUNK = 16384
+
+def view_module_header(view):
+    # Module name and imports of a view, parsed locally. The header is only
+    # parsed again when an edit touched it: when parsing stopped at some
+    # other code, the cached header text, up to the end of the line where
+    # it stops, is compared with the buffer. A header that runs to the end
+    # of the buffer, or did not parse, covers the whole buffer, so any
+    # change in size means it is parsed again.
+    change_count = view.change_count()
+    entry = header_cache.get(view.id())
+    if entry is not None:
+        cached_count, header_text, module_info, to_end = entry
+        if cached_count == change_count:
+            return module_info
+        if (not to_end or view.size() == len(header_text)) and \
+                view.substr(sublime.Region(0, len(header_text))) == header_text:
+            header_cache.set(view.id(), (change_count, header_text, module_info, to_end))
+            return module_info
+
+    size = view.size()
+    chunk = HEADER_CHUNK
+    while True:
+        end = min(size, chunk)
+        text = view.substr(sublime.Region(0, end))
+        result = parse_header(text)
+        if result is None:
+            header_end = end
+        else:
+            line_end = text.find('\n', result[1])
+            header_end = end if line_end == -1 else line_end + 1
+        # The header may go on after this chunk
+        if end == size or header_end < end:
+            break
+        chunk *= 4
+
+    module_info = None if result is None else result[0]
+    # Only a header followed by more lines can be reused while the rest grows
+    to_end = result is None or header_end >= size
+    header_cache.set(view.id(), (change_count, text[:header_end], module_info, to_end))
+    return module_info
+
+
+def minimal_edit(old_text, new_text):
+    # Find the smallest run of whole lines to replace to turn old_text into
+    # new_text, returns (begin, end, replacement) or None if they are equal
+    old_lines = old_text.splitlines(True)
+    new_lines = new_text.splitlines(True)
+    shortest = min(len(old_lines), len(new_lines))
+
+    prefix = 0
+    while prefix < shortest and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and old_lines[-1-suffix] == new_lines[-1-suffix]:
+        suffix += 1
+    if prefix == len(old_lines) == len(new_lines):
+        return None
 
-    if file_path in project_path_cache:
-        return project_path_cache[file_path]
-
-    project_path_cache[file_path] = target_folder
-    return target_folder
+    begin = sum([len(l) for l in old_lines[:prefix]])
+    end = len(old_text) - sum([len(l) for l in old_lines[len(old_lines)-suffix:]])
+    replacement = ''.join(new_lines[prefix:len(new_lines)-suffix])
+    return (begin, end, replacement)
+
+
+def project_views(project_dir):
+    # Open .purs views that belong to the project
+    views = []
+    for window in sublime.windows():
+        for view in window.views():
+            file_name = view.file_name()
+            if file_name is None or not file_name.endswith('.purs'):
+                continue
+            if find_project_dir(view) == project_dir:
+                views.append(view)
+    return views
+
+
+scratch_path = None
+scratch_lock = threading.Lock()
+
+def scratch_dir():
+    # Prefer a memory backed file system for files that only live shortly.
+    # The directory is created once per process by mkdtemp, so it is only
+    # accessible to us and its name cannot be guessed by other users
+    global scratch_path
+    with scratch_lock:
+        if scratch_path is None:
+            base = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) \
+                else tempfile.gettempdir()
+            scratch_path = tempfile.mkdtemp(prefix='purescript-ide-', dir=base)
+        return scratch_path
+
+
+def remove_scratch_dir():
+    global scratch_path
+    with scratch_lock:
+        if scratch_path is not None:
+            shutil.rmtree(scratch_path, ignore_errors=True)
+            scratch_path = None
+
+
+SCRATCH_PURPOSES = ['rebuild', 'import']
+
+def scratch_file_path(view, purpose='rebuild'):
+    return os.path.join(scratch_dir(), 'view-%d-%s.purs' % (view.id(), purpose))
+
+
+def write_scratch_file(view, text=None, purpose='rebuild'):
+    # One scratch copy per view and purpose, overwritten every time,
+    # to hand the unsaved content of a buffer to purs ide
+    if text is None:
+        text = view.substr(sublime.Region(0, view.size()))
+    path = scratch_file_path(view, purpose)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+def remove_scratch_file(view):
+    for purpose in SCRATCH_PURPOSES:
+        try:
+            os.unlink(scratch_file_path(view, purpose))
+        except OSError:
+            pass
 
 
 def ignore_non_purescript(f):
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+
+import sublime
+
+from .completion import flex_score
+from .index import ModuleIndex
+
+
+CACHE_VERSION = 1
+DECLARATION_KEYS = ['module', 'identifier', 'type', 'exportedFrom', 'definedAt']
+
+
+def output_module_mtimes(project_path):
+    # {module name: mtime of its externs} for the modules in output/,
+    # or None when the project has not been compiled
+    output_path = os.path.join(project_path, 'output')
+    try:
+        names = os.listdir(output_path)
+    except OSError:
+        return None
+    mtimes = {}
+    for name in names:
+        for externs in ['externs.cbor', 'externs.json']:
+            try:
+                mtimes[name] = os.stat(os.path.join(output_path, name, externs)).st_mtime
+                break
+            except OSError:
+                pass
+    return mtimes
+
+
+def cache_file_path(project_path):
+    name = hashlib.sha1(project_path.encode('utf-8')).hexdigest()
+    return os.path.join(sublime.cache_path(), 'purescript-ide', name + '.json')
+
+
+class WarmCache(object):
+    """What the server knew about a project at the end of the last session
+
+    Stored per project on disk with the externs mtime of every module. When
+    loaded, modules whose output changed since are left out, the rest can
+    answer completion and hover while the server is still loading.
+    """
+    def __init__(self, module_mtimes, declarations):
+        super().__init__()
+        self.module_mtimes = module_mtimes
+        self.module_index = ModuleIndex(module_mtimes.keys())
+        self.declarations = declarations
+        # identifier -> [declaration]
+        self.by_identifier = {}
+        for d in declarations:
+            self.by_identifier.setdefault(d['identifier'], []).append(d)
+
+    def completions(self, prefix, max_results):
+        scored = []
+        for index, d in enumerate(self.declarations):
+            score = flex_score(prefix, d['identifier'])
+            if score is not None:
+                scored.append((-score, index, d))
+        scored.sort(key=lambda x: (x[0], x[1]))
+        return [d for _, _, d in scored[:max_results]]
+
+    def type_info(self, identifier, imported_modules=[]):
+        found = self.by_identifier.get(identifier, [])
+        if len(imported_modules) == 0:
+            return found
+        imported = set(imported_modules)
+        return [ d for d in found
+                 if d['module'] in imported
+                 or len(imported.intersection(d.get('exportedFrom') or [])) > 0 ]
+
+    def save(self, project_path):
+        path = cache_file_path(project_path)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp_path = '%s.%d.tmp' % (path, threading.get_ident())
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({ 'version': CACHE_VERSION
+                      , 'project': project_path
+                      , 'modules': self.module_mtimes
+                      , 'declarations': self.declarations
+                      }, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, project_path):
+        current_mtimes = output_module_mtimes(project_path)
+        if not current_mtimes:
+            return None
+        try:
+            with open(cache_file_path(project_path), encoding='utf-8') as f:
+                stored = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if stored.get('version') != CACHE_VERSION or stored.get('project') != project_path:
+            return None
+
+        fresh = dict([ (m, t) for m, t in stored['modules'].items()
+                       if current_mtimes.get(m) == t ])
+        if len(fresh) == 0:
+            return None
+        declarations = [d for d in stored['declarations'] if d['module'] in fresh]
+        return cls(fresh, declarations)
+
+    @classmethod
+    def from_declarations(cls, module_mtimes, declarations):
+        # module_mtimes should be read before the modules were loaded,
+        # so that a module compiled meanwhile is not taken as fresh
+        declarations = [ dict([(k, d.get(k)) for k in DECLARATION_KEYS])
+                         for d in declarations ]
+        return cls(module_mtimes, declarations)
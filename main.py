@@ -1,8 +1,7 @@
 from .ide.auto_complete import *
-from .ide.command import plugin_unloaded
+from .ide.command import plugin_loaded, plugin_unloaded
 from .ide.error import *
 from .ide.rebuild import *
 from .ide.server import *
-from .ide.settings import plugin_loaded
 from .ide.text_command import *
 from .ide.type_hints import *